@@ -6,8 +6,11 @@ Para executar: python -m scripts.create_tables
 import asyncio
 import os
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine
-from src.infrastructure.repositories.sqlalchemy_user_repository import Base
+from src.infrastructure.repositories.sqlalchemy_user_repository import (
+    Base,
+    create_pooled_async_engine,
+    to_async_database_url,
+)
 
 
 async def create_database_tables():
@@ -19,24 +22,13 @@ async def create_database_tables():
         return
 
     # Garantir uso do driver asyncpg para PostgreSQL
-    if database_url.startswith("postgresql:") and "+asyncpg" not in database_url:
-        database_url = database_url.replace("postgresql:", "postgresql+asyncpg:")
-    elif database_url.startswith("postgres:") and "+asyncpg" not in database_url:
-        database_url = database_url.replace("postgres:", "postgresql+asyncpg:")
-
-    # Configurar argumentos de conexão para SSL se necessário
-    connect_args = {}
+    database_url = to_async_database_url(database_url)
 
     print(f"Conectando ao banco de dados: {database_url}")
     try:
-        # Criar engine com timeout maior
-        engine = create_async_engine(
-            database_url,
-            connect_args=connect_args,
-            pool_pre_ping=True,  # Verifica conexão antes de usar
-            pool_recycle=3600,  # Recicla conexões após 1 hora
-            echo=True,  # Mostra logs SQL para debug
-        )
+        # Script de execução única: o pre-ping só adiciona latência aqui.
+        # Os logs SQL são exibidos com DEBUG=1
+        engine = create_pooled_async_engine(database_url, pool_pre_ping=False)
 
         # Criar tabelas
         async with engine.begin() as conn:
@@ -52,6 +44,14 @@ async def create_database_tables():
 
 
 if __name__ == "__main__":
+    # Usa o uvloop quando disponível (não suportado no Windows)
+    try:
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         asyncio.run(create_database_tables())
     except Exception as e:
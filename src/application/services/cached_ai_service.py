@@ -0,0 +1,134 @@
+import hashlib
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+from src.application.services.ttl_cache import TTLCache
+from src.domain.interfaces.ai_service import AIService
+
+
+class CachedAIService(AIService):
+    """
+    Decorador do serviço AI que reaproveita respostas conversacionais repetidas.
+    Mensagens são normalizadas (espaços e maiúsculas/minúsculas) antes de gerar
+    a chave, e o cache é separado por nível do usuário.
+    """
+
+    def __init__(self, service: AIService, maxsize: int = 1024, ttl: float = 3600.0):
+        """
+        Inicializa o decorador com o serviço a ser envolvido.
+
+        Args:
+            service: Serviço AI que será chamado em caso de falta no cache
+            maxsize: Número máximo de respostas armazenadas
+            ttl: Tempo de vida de cada resposta, em segundos
+        """
+        self.service = service
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Normaliza o texto para que variações triviais gerem a mesma chave"""
+        return " ".join(text.split()).casefold()
+
+    def _build_key(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int
+    ) -> str:
+        """Gera a chave do cache a partir do nível e do histórico canônico"""
+        canonical = json.dumps(
+            [
+                [msg.get("role", ""), self._normalize(msg.get("content", ""))]
+                for msg in messages
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.blake2b(
+            f"{user_level}|{max_tokens}|{canonical}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    async def generate_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> str:
+        """Retorna a resposta em cache ou delega ao serviço envolvido"""
+        # A chave é calculada antes da chamada, pois alguns serviços alteram a lista
+        key = self._build_key(messages, user_level, max_tokens)
+        cached_response = self.cache.get(key)
+        if cached_response is not None:
+            return cached_response
+
+        response = await self.service.generate_response(
+            messages=messages, user_level=user_level, max_tokens=max_tokens
+        )
+
+        # Não armazena respostas vazias nem a mensagem padrão de erro
+        if response and response != self.FALLBACK_RESPONSE:
+            self.cache.set(key, response)
+
+        return response
+
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Retorna a resposta em cache de uma vez ou repassa as partes do serviço envolvido"""
+        key = self._build_key(messages, user_level, max_tokens)
+        cached_response = self.cache.get(key)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+        # Se o serviço interromper a geração, a exceção impede que a parte recebida
+        # seja armazenada como se fosse a resposta completa
+        chunks = []
+        async for chunk in self.service.stream_response(
+            messages=messages, user_level=user_level, max_tokens=max_tokens
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+        response = "".join(chunks)
+        if response and response != self.FALLBACK_RESPONSE:
+            self.cache.set(key, response)
+
+    async def generate_lesson_content(
+        self, topic: str, difficulty: str, category: str
+    ) -> Dict[str, Any]:
+        return await self.service.generate_lesson_content(
+            topic=topic, difficulty=difficulty, category=category
+        )
+
+    async def generate_exercises(
+        self, lesson_content: str, num_exercises: int = 5, difficulty: str = "medium"
+    ) -> List[Dict[str, Any]]:
+        return await self.service.generate_exercises(
+            lesson_content=lesson_content,
+            num_exercises=num_exercises,
+            difficulty=difficulty,
+        )
+
+    async def evaluate_response(
+        self, expected_pattern: str, user_response: str, user_level: str
+    ) -> Dict[str, Any]:
+        return await self.service.evaluate_response(
+            expected_pattern=expected_pattern,
+            user_response=user_response,
+            user_level=user_level,
+        )
+
+    async def evaluate_pronunciation(
+        self, expected_text: str, audio_transcription: str
+    ) -> Dict[str, Any]:
+        return await self.service.evaluate_pronunciation(
+            expected_text=expected_text, audio_transcription=audio_transcription
+        )
+
+    async def generate_vocabulary_list(
+        self, text: str, user_level: str, max_items: int = 10
+    ) -> List[Dict[str, str]]:
+        return await self.service.generate_vocabulary_list(
+            text=text, user_level=user_level, max_items=max_items
+        )
+
+    async def translate_text(self, text: str, target_language: str = "pt-br") -> str:
+        return await self.service.translate_text(
+            text=text, target_language=target_language
+        )
@@ -1,5 +1,7 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from src.application.services.cached_ai_service import CachedAIService
 from src.domain.interfaces.ai_service import AIService
 
 
@@ -14,10 +16,10 @@ class HybridAIService(AIService):
         Inicializa o serviço híbrido com os serviços específicos.
 
         Args:
-            conversation_service: Serviço para conversação (Gemini)
+            conversation_service: Serviço para conversação (Gemini), envolvido por um cache de respostas
             feature_service: Serviço para outras funcionalidades (Groq)
         """
-        self.conversation_service = conversation_service
+        self.conversation_service = CachedAIService(conversation_service)
         self.feature_service = feature_service
 
     async def generate_response(
@@ -28,6 +30,15 @@ class HybridAIService(AIService):
             messages=messages, user_level=user_level, max_tokens=max_tokens
         )
 
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Delega a geração de respostas conversacionais em partes para o Gemini"""
+        async for chunk in self.conversation_service.stream_response(
+            messages=messages, user_level=user_level, max_tokens=max_tokens
+        ):
+            yield chunk
+
     async def generate_lesson_content(
         self, topic: str, difficulty: str, category: str
     ) -> Dict[str, Any]:
@@ -77,3 +88,23 @@ class HybridAIService(AIService):
         return await self.feature_service.translate_text(
             text=text, target_language=target_language
         )
+
+    async def evaluate_and_extract(
+        self,
+        expected_pattern: str,
+        user_response: str,
+        user_level: str,
+        max_items: int = 10,
+    ) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """Avalia a resposta e extrai o vocabulário dela em paralelo no Groq"""
+        evaluation, vocabulary = await asyncio.gather(
+            self.feature_service.evaluate_response(
+                expected_pattern=expected_pattern,
+                user_response=user_response,
+                user_level=user_level,
+            ),
+            self.feature_service.generate_vocabulary_list(
+                text=user_response, user_level=user_level, max_items=max_items
+            ),
+        )
+        return evaluation, vocabulary
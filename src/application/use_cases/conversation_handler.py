@@ -1,13 +1,89 @@
-from typing import Any, Dict, List, Optional
+import functools
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from src.domain.entities.user import User
-from src.domain.interfaces.ai_service import AIService
+from src.domain.interfaces.ai_service import AIService, StreamInterruptedError
 from src.domain.interfaces.user_repository import UserRepository
 
+_SYSTEM_BASE_PROMPT = (
+    "Você é um tutor de inglês amigável e paciente. "
+    "Seu objetivo é ajudar o aluno a aprender inglês de forma natural e eficaz. "
+    "SEMPRE responda em português brasileiro, exceto quando demonstrar exemplos em inglês. "
+    "NUNCA responda como se você fosse o aluno ou como se não precisasse de ajuda com inglês. "
+    "IMPORTANTE: Você é o TUTOR, não o aluno. Nunca responda com frases como "
+    "'Como tutor, eu não preciso de ajuda com meu inglês' ou 'Eu sou o tutor, não preciso aprender inglês', "
+    "pois isso confunde os papéis. O usuário que está enviando mensagens é sempre o aluno "
+    "que precisa da sua ajuda para aprender inglês. "
+    "Seu papel é ajudar alunos brasileiros a aprenderem inglês, não o contrário. "
+)
+
+_SYSTEM_LEVEL_SUFFIXES = {
+    "beginner": (
+        "Este aluno está no nível INICIANTE. Use vocabulário simples, frases curtas, e "
+        "explique conceitos básicos. Use português para explicações. "
+        "Encoraje o uso de inglês simples e ofereça muitos exemplos básicos."
+    ),
+    "intermediate": (
+        "Este aluno está no nível INTERMEDIÁRIO. Use vocabulário mais diversificado, "
+        "construções gramaticais de média complexidade e use português para explicações "
+        "mais complexas. Corrija erros gentilmente e explique os motivos."
+    ),
+    "advanced": (
+        "Este aluno está no nível AVANÇADO. Use vocabulário rico, expressões idiomáticas, "
+        "e estruturas gramaticais complexas. Foque em nuances da língua, pronúncia refinada "
+        "e fluência. Corrija apenas erros significativos e desafie o aluno."
+    ),
+}
+
+_PRACTICE_BASE_PROMPT = (
+    "Você é um tutor de inglês conduzindo uma sessão de prática conversacional. "
+    "Faça perguntas, encoraje respostas e forneça feedback gentil. "
+    "SEMPRE responda em português brasileiro, exceto quando demonstrar exemplos em inglês. "
+    "NUNCA responda como se você fosse o aluno ou como se não precisasse de ajuda com inglês. "
+    "Como tutor, seu papel é ajudar alunos brasileiros a aprenderem inglês, não o contrário. "
+    "IMPORTANTE: Você NUNCA deve dizer frases como 'Como tutor, eu não preciso de ajuda com meu inglês', "
+    "pois isso é confundir seu papel. Você deve assumir que o usuário é o aluno que precisa de sua ajuda. "
+)
+
+_PRACTICE_LEVEL_CONTEXTS = {
+    "beginner": (
+        "O aluno é INICIANTE. Use vocabulário simples, faça perguntas básicas "
+        "e forneça muito suporte. Corrija erros fundamentais. "
+    ),
+    "intermediate": (
+        "O aluno é INTERMEDIÁRIO. Use vocabulário mais diversificado, "
+        "faça perguntas abertas e discuta tópicos de média complexidade. "
+    ),
+    "advanced": (
+        "O aluno é AVANÇADO. Use vocabulário rico, discuta tópicos complexos, "
+        "utilize expressões idiomáticas e estimule o pensamento crítico. "
+    ),
+}
+
+# Aviso exibido quando a geração da resposta é interrompida no meio
+_INTERRUPTED_NOTICE = "\n\n*(A resposta foi interrompida. Por favor, tente novamente.)*"
+
+# Prompts completos por nível, montados uma única vez na importação
+_SYSTEM_PROMPTS = {
+    level: _SYSTEM_BASE_PROMPT + suffix
+    for level, suffix in _SYSTEM_LEVEL_SUFFIXES.items()
+}
+_PRACTICE_PROMPTS = {
+    level: _PRACTICE_BASE_PROMPT + context
+    for level, context in _PRACTICE_LEVEL_CONTEXTS.items()
+}
+
 
 class ConversationHandlerUseCase:
     """Caso de uso para lidar com conversações seguindo o princípio de responsabilidade única"""
 
+    # Repetições do tutor só são descartadas entre as mensagens mais recentes
+    DEDUP_WINDOW = 10
+    # Tamanho mínimo para descartar uma repetição: explicações e listas longas,
+    # nunca respostas curtas que fazem parte do fluxo da conversa
+    DEDUP_MIN_LENGTH = 200
+
     def __init__(self, ai_service: AIService, user_repository: UserRepository):
         self.ai_service = ai_service
         self.user_repository = user_repository
@@ -20,15 +96,17 @@ class ConversationHandlerUseCase:
             return "Desculpe, não consegui encontrar seu registro. Por favor, registre-se primeiro."
 
         # Adicionar mensagem do usuário ao histórico
-        user.add_to_conversation_history("user", message_content)
-        user.update_last_interaction()
+        now = datetime.now()
+        user.add_to_conversation_history("user", message_content, timestamp=now)
+        user.update_last_interaction(now)
 
         # Preparar o contexto para a AI com base no nível do usuário
-        messages = self._prepare_context_for_ai(user)
+        user_level = user.proficiency_level.value
+        messages = self._prepare_context_for_ai(user, user_level)
 
         # Gerar resposta usando a IA
         response = await self.ai_service.generate_response(
-            messages=messages, user_level=user.proficiency_level.value
+            messages=messages, user_level=user_level
         )
 
         # Adicionar resposta ao histórico
@@ -39,6 +117,43 @@ class ConversationHandlerUseCase:
 
         return response
 
+    async def stream_message(
+        self, user_id: str, message_content: str
+    ) -> AsyncIterator[str]:
+        """Processa uma mensagem de texto e retorna a resposta em partes à medida que é gerada"""
+        user = await self.user_repository.get_by_id(user_id)
+
+        if not user:
+            yield "Desculpe, não consegui encontrar seu registro. Por favor, registre-se primeiro."
+            return
+
+        # Adicionar mensagem do usuário ao histórico
+        now = datetime.now()
+        user.add_to_conversation_history("user", message_content, timestamp=now)
+        user.update_last_interaction(now)
+
+        # Preparar o contexto para a AI com base no nível do usuário
+        user_level = user.proficiency_level.value
+        messages = self._prepare_context_for_ai(user, user_level)
+
+        # Repassar as partes da resposta enquanto são geradas
+        chunks = []
+        try:
+            async for chunk in self.ai_service.stream_response(
+                messages=messages, user_level=user_level
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except StreamInterruptedError:
+            # A resposta truncada não entra no histórico; só a mensagem do aluno é salva
+            yield _INTERRUPTED_NOTICE
+            await self.user_repository.save(user)
+            return
+
+        # Adicionar a resposta completa ao histórico e salvar o usuário
+        user.add_to_conversation_history("assistant", "".join(chunks))
+        await self.user_repository.save(user)
+
     async def start_practice_session(
         self, user_id: str, topic: Optional[str] = None
     ) -> str:
@@ -49,7 +164,8 @@ class ConversationHandlerUseCase:
             return "Desculpe, não consegui encontrar seu registro. Por favor, registre-se primeiro."
 
         # Preparar mensagem de sistema específica para prática
-        practice_prompt = self._get_practice_prompt(user.proficiency_level.value, topic)
+        user_level = user.proficiency_level.value
+        practice_prompt = self._get_practice_prompt(user_level, topic)
 
         # Adicionar instruções explícitas para iniciar a conversa corretamente
         initial_instructions = (
@@ -62,12 +178,13 @@ class ConversationHandlerUseCase:
         )
 
         # Limpar histórico de conversação anterior para iniciar uma nova sessão
-        user.conversation_history = []
+        user.conversation_history.clear()
 
         # Adicionar contexto inicial com instruções explícitas
         combined_prompt = f"{initial_instructions}\n\n{practice_prompt}"
-        user.add_to_conversation_history("system", combined_prompt)
-        user.update_last_interaction()
+        now = datetime.now()
+        user.add_to_conversation_history("system", combined_prompt, timestamp=now)
+        user.update_last_interaction(now)
 
         # Gerar mensagem inicial com instruções explícitas para primeira resposta
         intro_prompt = "Olá! Nova sessão de tutoria iniciada sobre o tema: " + (
@@ -80,7 +197,7 @@ class ConversationHandlerUseCase:
 
         welcome_message = await self.ai_service.generate_response(
             messages=messages,
-            user_level=user.proficiency_level.value,
+            user_level=user_level,
         )
 
         # Adicionar resposta do assistente ao histórico
@@ -103,22 +220,26 @@ class ConversationHandlerUseCase:
         if not user:
             return {"error": "Usuário não encontrado"}
 
+        user_level = user.proficiency_level.value
+
         # Se não houver um padrão esperado, usamos o contexto conversacional
         if not expected_pattern and user.conversation_history:
-            # Pegar a última mensagem do assistente como contexto
-            assistant_messages = [
-                msg
-                for msg in user.conversation_history
-                if msg.get("role") == "assistant"
-            ]
-
-            if assistant_messages:
-                last_message = assistant_messages[-1].get("content", "")
+            # Pegar a última mensagem do assistente como contexto, buscando do fim
+            last_message = next(
+                (
+                    msg.get("content", "")
+                    for msg in reversed(user.conversation_history)
+                    if msg.get("role") == "assistant"
+                ),
+                None,
+            )
+
+            if last_message is not None:
                 # Usar a última mensagem como contexto para avaliação
                 evaluation = await self.ai_service.evaluate_response(
                     expected_pattern=last_message,
                     user_response=user_response,
-                    user_level=user.proficiency_level.value,
+                    user_level=user_level,
                 )
                 return evaluation
 
@@ -127,103 +248,88 @@ class ConversationHandlerUseCase:
             evaluation = await self.ai_service.evaluate_response(
                 expected_pattern=expected_pattern,
                 user_response=user_response,
-                user_level=user.proficiency_level.value,
+                user_level=user_level,
             )
 
             # Atualizar progresso com base na avaliação
-            if "grammar_score" in evaluation:
-                user.update_progress(grammar_accuracy=evaluation["grammar_score"])
+            if "grammar_score" in evaluation and user.update_progress(
+                grammar_accuracy=evaluation["grammar_score"]
+            ):
                 await self.user_repository.save(user)
 
             return evaluation
 
         return {"error": "Não foi possível avaliar a resposta sem contexto adequado"}
 
-    def _prepare_context_for_ai(self, user: User) -> List[Dict[str, str]]:
+    def _prepare_context_for_ai(
+        self, user: User, user_level: str
+    ) -> List[Dict[str, str]]:
         """Prepara o contexto para enviar à IA com base no usuário"""
-        # Inicializar com uma mensagem de sistema
+        # Inicializar com uma mensagem de sistema: persona fixa seguida do sufixo do
+        # nível, mantendo um prefixo idêntico que os provedores podem reaproveitar
         messages = [
             {
                 "role": "system",
-                "content": self._get_system_prompt(user.proficiency_level.value),
+                "content": self._get_system_prompt(user_level),
             }
         ]
 
-        # Adicionar histórico de conversação recente
-        for message in user.conversation_history:
-            if "role" in message and "content" in message:
-                messages.append(
-                    {"role": message["role"], "content": message["content"]}
-                )
+        # Adicionar histórico de conversação recente, descartando repetições de
+        # mensagens longas do tutor (explicações e listas que ele reapresenta)
+        history = user.conversation_history
+        last_index = len(history) - 1
+        window_start = len(history) - self.DEDUP_WINDOW
+        min_length = self.DEDUP_MIN_LENGTH
+        seen = set()
+
+        # Referências locais evitam buscas de atributo repetidas no laço
+        append = messages.append
+        remember = seen.add
+        normalize = self._normalize_content
+
+        for index, message in enumerate(history):
+            if "role" not in message or "content" not in message:
+                continue
+
+            role = message["role"]
+            content = message["content"]
+
+            # Apenas mensagens longas do tutor dentro da janela recente são candidatas;
+            # mensagens do aluno, de sistema e a mensagem atual nunca são descartadas
+            if (
+                role == "assistant"
+                and index >= window_start
+                and index != last_index
+                and len(content) >= min_length
+            ):
+                key = normalize(content)
+                if key in seen:
+                    continue
+                remember(key)
+
+            # Apenas os campos esperados pelos provedores (sem o timestamp)
+            append({"role": role, "content": content})
 
         return messages
 
-    def _get_system_prompt(self, user_level: str) -> str:
-        """Obtém o prompt de sistema apropriado com base no nível do usuário"""
-        base_prompt = (
-            "Você é um tutor de inglês amigável e paciente. "
-            "Seu objetivo é ajudar o aluno a aprender inglês de forma natural e eficaz. "
-            "SEMPRE responda em português brasileiro, exceto quando demonstrar exemplos em inglês. "
-            "NUNCA responda como se você fosse o aluno ou como se não precisasse de ajuda com inglês. "
-            "IMPORTANTE: Você é o TUTOR, não o aluno. Nunca responda com frases como "
-            "'Como tutor, eu não preciso de ajuda com meu inglês' ou 'Eu sou o tutor, não preciso aprender inglês', "
-            "pois isso confunde os papéis. O usuário que está enviando mensagens é sempre o aluno "
-            "que precisa da sua ajuda para aprender inglês. "
-            "Seu papel é ajudar alunos brasileiros a aprenderem inglês, não o contrário. "
-        )
+    @staticmethod
+    def _normalize_content(content: str) -> str:
+        """Normaliza o conteúdo de uma mensagem para detectar repetições"""
+        return " ".join(content.split()).casefold()
 
-        if user_level == "beginner":
-            return base_prompt + (
-                "Este aluno está no nível INICIANTE. Use vocabulário simples, frases curtas, e "
-                "explique conceitos básicos. Use português para explicações. "
-                "Encoraje o uso de inglês simples e ofereça muitos exemplos básicos."
-            )
-        elif user_level == "intermediate":
-            return base_prompt + (
-                "Este aluno está no nível INTERMEDIÁRIO. Use vocabulário mais diversificado, "
-                "construções gramaticais de média complexidade e use português para explicações "
-                "mais complexas. Corrija erros gentilmente e explique os motivos."
-            )
-        elif user_level == "advanced":
-            return base_prompt + (
-                "Este aluno está no nível AVANÇADO. Use vocabulário rico, expressões idiomáticas, "
-                "e estruturas gramaticais complexas. Foque em nuances da língua, pronúncia refinada "
-                "e fluência. Corrija apenas erros significativos e desafie o aluno."
-            )
-        else:
-            return base_prompt
+    @staticmethod
+    def _get_system_prompt(user_level: str) -> str:
+        """Obtém o prompt de sistema apropriado com base no nível do usuário"""
+        return _SYSTEM_PROMPTS.get(user_level, _SYSTEM_BASE_PROMPT)
 
-    def _get_practice_prompt(self, user_level: str, topic: Optional[str] = None) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _get_practice_prompt(user_level: str, topic: Optional[str] = None) -> str:
         """Obtém o prompt para uma sessão de prática baseado no nível e tópico"""
-        base_prompt = (
-            "Você é um tutor de inglês conduzindo uma sessão de prática conversacional. "
-            "Faça perguntas, encoraje respostas e forneça feedback gentil. "
-            "SEMPRE responda em português brasileiro, exceto quando demonstrar exemplos em inglês. "
-            "NUNCA responda como se você fosse o aluno ou como se não precisasse de ajuda com inglês. "
-            "Como tutor, seu papel é ajudar alunos brasileiros a aprenderem inglês, não o contrário. "
-            "IMPORTANTE: Você NUNCA deve dizer frases como 'Como tutor, eu não preciso de ajuda com meu inglês', "
-            "pois isso é confundir seu papel. Você deve assumir que o usuário é o aluno que precisa de sua ajuda. "
-        )
+        prompt = _PRACTICE_PROMPTS.get(user_level, _PRACTICE_BASE_PROMPT)
 
-        topic_context = ""
+        # O tópico fica no final para que o prefixo estático seja igual entre sessões
         if topic:
-            topic_context = f"O tópico desta sessão é: {topic}. "
-
-        level_context = ""
-        if user_level == "beginner":
-            level_context = (
-                "O aluno é INICIANTE. Use vocabulário simples, faça perguntas básicas "
-                "e forneça muito suporte. Corrija erros fundamentais."
-            )
-        elif user_level == "intermediate":
-            level_context = (
-                "O aluno é INTERMEDIÁRIO. Use vocabulário mais diversificado, "
-                "faça perguntas abertas e discuta tópicos de média complexidade."
-            )
-        elif user_level == "advanced":
-            level_context = (
-                "O aluno é AVANÇADO. Use vocabulário rico, discuta tópicos complexos, "
-                "utilize expressões idiomáticas e estimule o pensamento crítico."
-            )
+            return prompt + f"O tópico desta sessão é: {topic}."
 
-        return base_prompt + topic_context + level_context
+        return prompt
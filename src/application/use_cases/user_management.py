@@ -1,4 +1,5 @@
 import uuid
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from src.domain.entities.user import ProficiencyLevel, User, UserProgress
@@ -11,13 +12,17 @@ class UserManagementUseCase:
     def __init__(self, user_repository: UserRepository):
         self.user_repository = user_repository
 
+    def unit_of_work(self):
+        """Agrupa as gravações de usuário feitas no bloco em uma única escrita"""
+        return self.user_repository.unit_of_work()
+
     async def register_user(self, discord_id: str, username: str) -> User:
         """Registra um novo usuário no sistema"""
-        existing_user = await self.user_repository.get_by_discord_id(discord_id)
-
-        if existing_user:
-            return existing_user
+        return await self.get_or_create_user(discord_id=discord_id, username=username)
 
+    async def get_or_create_user(self, discord_id: str, username: str) -> User:
+        """Recupera o usuário pelo ID do Discord, registrando-o se ainda não existir"""
+        # Busca e criação ficam a cargo do repositório, que pode fazê-las juntas
         new_user = User(
             id=str(uuid.uuid4()),
             discord_id=discord_id,
@@ -26,7 +31,7 @@ class UserManagementUseCase:
             progress=UserProgress(),
         )
 
-        return await self.user_repository.save(new_user)
+        return await self.user_repository.get_or_create(new_user)
 
     async def update_user_level(self, user_id: str, new_level: str) -> Optional[User]:
         """Atualiza o nível de proficiência de um usuário"""
@@ -51,7 +56,7 @@ class UserManagementUseCase:
         if not user:
             return None
 
-        user.update_progress(
+        changed = user.update_progress(
             vocabulary_mastered=progress_data.get("vocabulary_mastered", 0),
             lessons_completed=progress_data.get("lessons_completed", 0),
             practice_sessions=progress_data.get("practice_sessions", 0),
@@ -60,6 +65,10 @@ class UserManagementUseCase:
             completed_topic=progress_data.get("completed_topic"),
         )
 
+        # Sem alterações, não há nível a recalcular nem o que gravar
+        if not changed:
+            return user
+
         # Verificar se o usuário pode subir de nível
         if user.should_level_up():
             user.level_up()
@@ -77,33 +86,36 @@ class UserManagementUseCase:
         if not user:
             return None
 
+        progress = user.progress
         return {
             "username": user.username,
             "proficiency_level": user.proficiency_level.value,
-            "vocabulary_mastered": user.progress.vocabulary_mastered,
-            "lessons_completed": user.progress.lessons_completed,
-            "practice_sessions": user.progress.practice_sessions,
-            "pronunciation_score": round(user.progress.pronunciation_score * 100, 1),
-            "grammar_accuracy": round(user.progress.grammar_accuracy * 100, 1),
-            "completed_topics": user.progress.completed_topics,
+            "vocabulary_mastered": progress.vocabulary_mastered,
+            "lessons_completed": progress.lessons_completed,
+            "practice_sessions": progress.practice_sessions,
+            "pronunciation_score": round(progress.pronunciation_score * 100, 1),
+            "grammar_accuracy": round(progress.grammar_accuracy * 100, 1),
+            "completed_topics": progress.completed_topics,
             "last_active": (
-                user.progress.last_active.isoformat()
-                if user.progress.last_active
-                else None
+                progress.last_active.isoformat() if progress.last_active else None
             ),
         }
 
     async def add_to_conversation_history(
         self, user_id: str, role: str, content: str
     ) -> bool:
-        """Adiciona uma mensagem ao histórico de conversação do usuário"""
+        """
+        Adiciona uma mensagem ao histórico de conversação do usuário.
+        Dentro de uma unidade de trabalho, a gravação é feita ao final do bloco.
+        """
         user = await self.user_repository.get_by_id(user_id)
 
         if not user:
             return False
 
-        user.add_to_conversation_history(role, content)
-        user.update_last_interaction()
+        now = datetime.now()
+        user.add_to_conversation_history(role, content, timestamp=now)
+        user.update_last_interaction(now)
 
         await self.user_repository.save(user)
         return True
@@ -115,4 +127,17 @@ class UserManagementUseCase:
         if not user:
             return []
 
-        return user.conversation_history
+        # Os horários são armazenados como epoch e formatados em ISO 8601 na saída
+        return [
+            (
+                {
+                    **message,
+                    "timestamp": datetime.fromtimestamp(
+                        message["timestamp"]
+                    ).isoformat(),
+                }
+                if isinstance(message.get("timestamp"), (int, float))
+                else dict(message)
+            )
+            for message in user.conversation_history
+        ]
@@ -3,6 +3,9 @@ from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional
 
+# Seções em que o conteúdo da lição é dividido, na ordem em que aparecem
+_SECTION_KEYS = ("introduction", "main_content", "examples", "practice", "conclusion")
+
 
 class LessonDifficulty(Enum):
     EASY = "easy"
@@ -20,7 +23,7 @@ class LessonCategory(Enum):
     LISTENING = "listening"
 
 
-@dataclass
+@dataclass(slots=True)
 class Exercise:
     id: str
     question: str
@@ -30,7 +33,7 @@ class Exercise:
     is_open_ended: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class Lesson:
     id: str
     title: str
@@ -44,6 +47,13 @@ class Lesson:
     created_at: datetime = field(default_factory=datetime.now)
     estimated_time_minutes: int = 15
     next_lesson_id: Optional[str] = None
+    # Seções calculadas a partir de `content`, refeitas se o conteúdo mudar
+    _sections: Optional[Dict[str, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _sections_source: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def add_exercise(self, exercise: Exercise):
         self.exercises.append(exercise)
@@ -67,26 +77,12 @@ class Lesson:
 
     def get_content_by_section(self) -> Dict[str, str]:
         """Retorna o conteúdo da lição dividido em seções"""
-        sections = {
-            "introduction": "",
-            "main_content": "",
-            "examples": "",
-            "practice": "",
-            "conclusion": "",
-        }
-
-        # Em uma implementação completa, aqui parsearíamos o conteúdo em seções
-        # Por simplicidade, apenas dividimos o conteúdo em partes iguais
-        parts = self.content.split("\n\n")
-        if len(parts) >= 1:
-            sections["introduction"] = parts[0]
-        if len(parts) >= 2:
-            sections["main_content"] = parts[1]
-        if len(parts) >= 3:
-            sections["examples"] = parts[2]
-        if len(parts) >= 4:
-            sections["practice"] = parts[3]
-        if len(parts) >= 5:
-            sections["conclusion"] = parts[4]
-
-        return sections
+        if self._sections is None or self._sections_source is not self.content:
+            # Em uma implementação completa, aqui parsearíamos o conteúdo em seções
+            # Por simplicidade, apenas dividimos o conteúdo em partes iguais
+            parts = self.content.split("\n\n")
+            parts += [""] * (len(_SECTION_KEYS) - len(parts))
+            self._sections = dict(zip(_SECTION_KEYS, parts))
+            self._sections_source = self.content
+
+        return dict(self._sections)
@@ -1,7 +1,12 @@
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional
+
+# Limita o histórico para as últimas 20 mensagens para evitar tokens excessivos
+MAX_CONVERSATION_HISTORY = 20
 
 
 class ProficiencyLevel(Enum):
@@ -10,31 +15,58 @@ class ProficiencyLevel(Enum):
     ADVANCED = "advanced"
 
 
-@dataclass
+# Requisitos para subir de nível: (lições concluídas, pronúncia mínima, gramática mínima)
+_LEVEL_UP_THRESHOLDS = {
+    ProficiencyLevel.BEGINNER: (10, 0.7, 0.7),
+    ProficiencyLevel.INTERMEDIATE: (25, 0.8, 0.8),
+}
+
+# Próximo nível de proficiência a partir do nível atual
+_NEXT_LEVEL = {
+    ProficiencyLevel.BEGINNER: ProficiencyLevel.INTERMEDIATE,
+    ProficiencyLevel.INTERMEDIATE: ProficiencyLevel.ADVANCED,
+}
+
+
+@dataclass(slots=True)
 class UserProgress:
     vocabulary_mastered: int = 0
     lessons_completed: int = 0
     practice_sessions: int = 0
     pronunciation_score: float = 0.0
     grammar_accuracy: float = 0.0
-    last_active: datetime = field(default_factory=datetime.now)
+    # None até a primeira gravação: o banco preenche o horário de criação
+    last_active: Optional[datetime] = None
     completed_topics: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: str
     discord_id: str
     username: str
     proficiency_level: ProficiencyLevel = ProficiencyLevel.BEGINNER
     progress: UserProgress = field(default_factory=UserProgress)
-    conversation_history: List[Dict] = field(default_factory=list)
-    created_at: datetime = field(default_factory=datetime.now)
+    conversation_history: Deque[Dict] = field(
+        default_factory=lambda: deque(maxlen=MAX_CONVERSATION_HISTORY)
+    )
+    # Preenchido pelo banco (server_default) na criação do usuário
+    created_at: Optional[datetime] = None
     last_interaction: Optional[datetime] = None
 
-    def update_last_interaction(self):
-        self.last_interaction = datetime.now()
-        self.progress.last_active = datetime.now()
+    def __post_init__(self):
+        # Garante o limite do histórico quando o usuário é criado a partir de uma lista
+        if (
+            not isinstance(self.conversation_history, deque)
+            or self.conversation_history.maxlen != MAX_CONVERSATION_HISTORY
+        ):
+            self.conversation_history = deque(
+                self.conversation_history, maxlen=MAX_CONVERSATION_HISTORY
+            )
+
+    def update_last_interaction(self, now: Optional[datetime] = None):
+        now = now or datetime.now()
+        self.last_interaction = self.progress.last_active = now
 
     def update_progress(
         self,
@@ -44,7 +76,23 @@ class User:
         pronunciation_score: float = 0.0,
         grammar_accuracy: float = 0.0,
         completed_topic: Optional[str] = None,
-    ):
+    ) -> bool:
+        """Atualiza o progresso do usuário e retorna se algo foi alterado"""
+        is_new_topic = bool(completed_topic) and (
+            completed_topic not in self.progress.completed_topics
+        )
+
+        # Nada a atualizar: evita o recálculo e a gravação pelo chamador
+        if not (
+            vocabulary_mastered
+            or lessons_completed
+            or practice_sessions
+            or pronunciation_score > 0
+            or grammar_accuracy > 0
+            or is_new_topic
+        ):
+            return False
+
         self.progress.vocabulary_mastered += vocabulary_mastered
         self.progress.lessons_completed += lessons_completed
         self.progress.practice_sessions += practice_sessions
@@ -60,44 +108,46 @@ class User:
                 self.progress.grammar_accuracy * 0.7 + grammar_accuracy * 0.3
             )
 
-        if completed_topic and completed_topic not in self.progress.completed_topics:
+        if is_new_topic:
             self.progress.completed_topics.append(completed_topic)
 
+        return True
+
     def should_level_up(self) -> bool:
         """Verifica se o usuário deve subir de nível com base no progresso"""
-        if self.proficiency_level == ProficiencyLevel.BEGINNER:
-            return (
-                self.progress.lessons_completed >= 10
-                and self.progress.pronunciation_score >= 0.7
-                and self.progress.grammar_accuracy >= 0.7
-            )
-        elif self.proficiency_level == ProficiencyLevel.INTERMEDIATE:
-            return (
-                self.progress.lessons_completed >= 25
-                and self.progress.pronunciation_score >= 0.8
-                and self.progress.grammar_accuracy >= 0.8
-            )
-        return False
+        thresholds = _LEVEL_UP_THRESHOLDS.get(self.proficiency_level)
+        if thresholds is None:
+            return False
+
+        min_lessons, min_pronunciation, min_grammar = thresholds
+        progress = self.progress
+        return (
+            progress.lessons_completed >= min_lessons
+            and progress.pronunciation_score >= min_pronunciation
+            and progress.grammar_accuracy >= min_grammar
+        )
 
     def level_up(self) -> bool:
         """Tenta aumentar o nível de proficiência do usuário"""
         if not self.should_level_up():
             return False
 
-        if self.proficiency_level == ProficiencyLevel.BEGINNER:
-            self.proficiency_level = ProficiencyLevel.INTERMEDIATE
-            return True
-        elif self.proficiency_level == ProficiencyLevel.INTERMEDIATE:
-            self.proficiency_level = ProficiencyLevel.ADVANCED
-            return True
-        return False
+        next_level = _NEXT_LEVEL.get(self.proficiency_level)
+        if next_level is None:
+            return False
+
+        self.proficiency_level = next_level
+        return True
 
-    def add_to_conversation_history(self, role: str, content: str):
-        """Adiciona uma mensagem ao histórico de conversação"""
+    def add_to_conversation_history(
+        self, role: str, content: str, timestamp: Optional[datetime] = None
+    ):
+        """
+        Adiciona uma mensagem ao histórico de conversação.
+        O horário é armazenado como timestamp epoch (float) e só é formatado na saída.
+        """
+        epoch = timestamp.timestamp() if timestamp else time.time()
+        # O deque descarta automaticamente as mensagens mais antigas
         self.conversation_history.append(
-            {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+            {"role": role, "content": content, "timestamp": epoch}
         )
-
-        # Limita o histórico para as últimas 20 mensagens para evitar tokens excessivos
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
@@ -1,10 +1,18 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List
+
+
+class StreamInterruptedError(Exception):
+    """A geração em partes falhou depois de parte da resposta já ter sido entregue"""
 
 
 class AIService(ABC):
     """Interface para serviços de AI seguindo o princípio de inversão de dependência"""
 
+    # Resposta padrão retornada quando a geração falha
+    FALLBACK_RESPONSE = "Desculpe, não consegui gerar uma resposta. Por favor, tente novamente mais tarde."
+
     @abstractmethod
     async def generate_response(
         self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
@@ -12,6 +20,19 @@ class AIService(ABC):
         """Gera uma resposta com base no histórico de mensagens e nível do usuário"""
         pass
 
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """
+        Gera a resposta em partes à medida que ela é produzida.
+        Por padrão, retorna a resposta completa de `generate_response` em uma única parte.
+        Se a geração falhar depois de alguma parte já entregue, lança
+        `StreamInterruptedError`, para que a resposta truncada não seja tratada como completa.
+        """
+        yield await self.generate_response(
+            messages=messages, user_level=user_level, max_tokens=max_tokens
+        )
+
     @abstractmethod
     async def generate_lesson_content(
         self, topic: str, difficulty: str, category: str
@@ -51,3 +72,45 @@ class AIService(ABC):
     async def translate_text(self, text: str, target_language: str = "pt-br") -> str:
         """Traduz um texto para o idioma de destino"""
         pass
+
+    async def generate_full_lesson_pack(
+        self,
+        topic: str,
+        difficulty: str,
+        category: str,
+        user_level: str,
+        num_exercises: int = 5,
+        max_items: int = 10,
+    ) -> Dict[str, Any]:
+        """
+        Gera a lição e, assim que o conteúdo estiver pronto, gera exercícios
+        e vocabulário em paralelo a partir dele. `difficulty` é a dificuldade da
+        lição e `user_level`, o nível de proficiência usado no vocabulário.
+        """
+        lesson = await self.generate_lesson_content(
+            topic=topic, difficulty=difficulty, category=category
+        )
+        lesson_text = "\n\n".join(
+            str(lesson.get(section, ""))
+            for section in (
+                "introduction",
+                "main_content",
+                "examples",
+                "practice",
+                "conclusion",
+            )
+        )
+
+        exercises, vocabulary = await asyncio.gather(
+            self.generate_exercises(
+                lesson_content=lesson_text,
+                num_exercises=num_exercises,
+                difficulty=difficulty,
+            ),
+            self.generate_vocabulary_list(
+                text=lesson_text,
+                user_level=user_level,
+                max_items=max_items,
+            ),
+        )
+        return {"lesson": lesson, "exercises": exercises, "vocabulary": vocabulary}
@@ -17,6 +17,13 @@ class SpeechService(ABC):
         """Analisa a pronúncia em um arquivo de áudio comparando com um texto esperado"""
         pass
 
+    @abstractmethod
+    def score_pronunciation(
+        self, transcribed_text: str, expected_text: str
+    ) -> Dict[str, Any]:
+        """Avalia a pronúncia a partir de uma transcrição já obtida"""
+        pass
+
     @abstractmethod
     async def detect_language(self, audio_file_path: str) -> str:
         """Detecta o idioma falado em um arquivo de áudio"""
@@ -35,3 +42,12 @@ class SpeechService(ABC):
     ) -> Dict[str, Any]:
         """Processa uma gravação de voz enviada por um usuário do Discord"""
         pass
+
+    @abstractmethod
+    async def download_attachment(self, url: str, user_id: str) -> Optional[str]:
+        """Baixa um anexo de áudio e retorna o caminho local, ou None se falhar"""
+        pass
+
+    async def aclose(self) -> None:
+        """Libera recursos mantidos pelo serviço, como conexões HTTP. Por padrão, não faz nada"""
+        pass
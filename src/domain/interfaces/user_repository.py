@@ -1,8 +1,16 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
 
 from src.domain.entities.user import User
 
+# Usuários com gravação adiada pela unidade de trabalho ativa na tarefa atual
+_pending_saves: ContextVar[Optional[Dict[str, User]]] = ContextVar(
+    "pending_user_saves", default=None
+)
+
 
 class UserRepository(ABC):
     """Interface para o repositório de usuários seguindo o princípio de inversão de dependência"""
@@ -22,6 +30,26 @@ class UserRepository(ABC):
         """Salva ou atualiza um usuário no repositório"""
         pass
 
+    async def save_many(self, users: List[User], concurrency: int = 16) -> List[User]:
+        """Salva vários usuários, com no máximo `concurrency` gravações simultâneas"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def save_one(user: User) -> User:
+            async with semaphore:
+                return await self.save(user)
+
+        return list(await asyncio.gather(*(save_one(user) for user in users)))
+
+    async def get_or_create(self, user: User) -> User:
+        """
+        Retorna o usuário já cadastrado com o mesmo ID do Discord ou grava o
+        usuário informado. Implementações podem fazer isso em uma única operação.
+        """
+        existing_user = await self.get_by_discord_id(user.discord_id)
+        if existing_user:
+            return existing_user
+        return await self.save(user)
+
     @abstractmethod
     async def delete(self, user_id: str) -> bool:
         """Remove um usuário do repositório"""
@@ -32,6 +60,11 @@ class UserRepository(ABC):
         """Lista todos os usuários"""
         pass
 
+    async def iter_all(self) -> AsyncIterator[User]:
+        """Percorre todos os usuários sem exigir que estejam todos em memória"""
+        for user in await self.list_all():
+            yield user
+
     @abstractmethod
     async def list_by_proficiency(self, proficiency_level: str) -> List[User]:
         """Lista usuários por nível de proficiência"""
@@ -41,3 +74,61 @@ class UserRepository(ABC):
     async def get_user_statistics(self) -> dict:
         """Retorna estatísticas agregadas sobre os usuários"""
         pass
+
+    async def initialize(self) -> None:
+        """Prepara o armazenamento, como a criação de tabelas. Por padrão, não faz nada"""
+        pass
+
+    async def aclose(self) -> None:
+        """Libera recursos mantidos pelo repositório, como conexões. Por padrão, não faz nada"""
+        pass
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[None]:
+        """
+        Agrupa os `save` feitos dentro do bloco em uma única gravação por usuário,
+        executada ao final do bloco se nenhuma exceção ocorrer.
+        """
+        if _pending_saves.get() is not None:
+            # Já existe uma unidade de trabalho ativa, que fará as gravações
+            yield
+            return
+
+        pending: Dict[str, User] = {}
+        token = _pending_saves.set(pending)
+        try:
+            yield
+        finally:
+            _pending_saves.reset(token)
+
+        if pending:
+            await self.save_many(list(pending.values()))
+
+    def _in_unit_of_work(self) -> bool:
+        """Indica se há uma unidade de trabalho ativa na tarefa atual"""
+        return _pending_saves.get() is not None
+
+    def _defer_save(self, user: User) -> bool:
+        """Adia a gravação do usuário se houver uma unidade de trabalho ativa"""
+        pending = _pending_saves.get()
+        if pending is None:
+            return False
+
+        pending[user.id] = user
+        return True
+
+    def _get_pending(
+        self, user_id: Optional[str] = None, discord_id: Optional[str] = None
+    ) -> Optional[User]:
+        """Recupera um usuário com gravação pendente na unidade de trabalho ativa"""
+        pending = _pending_saves.get()
+        if not pending:
+            return None
+
+        if user_id is not None:
+            return pending.get(user_id)
+
+        for user in pending.values():
+            if user.discord_id == discord_id:
+                return user
+        return None
@@ -1,10 +1,28 @@
+import logging
 import os
-from typing import Any, Dict, List, Optional
+from string import Template
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import google.generativeai as genai
+from google.generativeai.generative_models import ChatSession
 from google.generativeai.types import HarmBlockThreshold, HarmCategory
 
-from src.domain.interfaces.ai_service import AIService
+from src.domain.entities.user import ProficiencyLevel
+from src.domain.interfaces.ai_service import AIService, StreamInterruptedError
+
+logger = logging.getLogger(__name__)
+
+# Instruções fixas do tutor, enviadas como system_instruction do modelo
+STRONG_INSTRUCTIONS = Template(
+    "INSTRUÇÕES IMPORTANTES: Você é o VerbaMentor, um tutor de inglês que ajuda alunos brasileiros. "
+    "SEMPRE responda em português brasileiro exceto ao demonstrar exemplos em inglês. "
+    "Você NUNCA deve responder como se você fosse o aluno que está aprendendo inglês. "
+    "Você NUNCA deve dizer frases como 'não preciso de ajuda com meu inglês' ou similares. "
+    "Você é o PROFESSOR aqui para ensinar, e deve assumir que qualquer mensagem do usuário "
+    "é de um ALUNO que precisa aprender inglês. Se a mensagem inicial parecer oferecer ajuda "
+    "a você, considere que é apenas uma pergunta sobre um tema de inglês e responda como TUTOR. "
+    "O aluno está no nível ${user_level}."
+)
 
 
 class GeminiService(AIService):
@@ -34,89 +52,148 @@ class GeminiService(AIService):
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
         }
 
-        # Criar o modelo
+        # Criar um modelo por nível, cada um com suas instruções de sistema
+        self.model_name = "gemini-1.5-flash"
+        self._models_by_level: Dict[str, genai.GenerativeModel] = {}
         try:
-            # Utilizar modelo gemini-pro por ser mais estável
-            self.model = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",
+            for level in ProficiencyLevel:
+                self._model_for(level.value)
+            logger.info("Modelo Gemini inicializado com sucesso")
+        except Exception as e:
+            logger.exception("Erro ao inicializar o modelo Gemini")
+            raise ValueError(f"Não foi possível inicializar o modelo Gemini. Erro: {e}")
+
+    def _model_for(self, user_level: str) -> genai.GenerativeModel:
+        """Retorna o modelo com as instruções do nível, criando-o na primeira vez"""
+        model = self._models_by_level.get(user_level)
+        if model is None:
+            model = genai.GenerativeModel(
+                model_name=self.model_name,
                 generation_config=self.generation_config,
                 safety_settings=self.safety_settings,
+                system_instruction=STRONG_INSTRUCTIONS.safe_substitute(
+                    user_level=user_level
+                ),
             )
-            print("Modelo Gemini-Pro inicializado com sucesso")
-        except Exception as e:
-            print(f"Erro ao inicializar o modelo Gemini: {e}")
-            raise ValueError(f"Não foi possível inicializar o modelo Gemini. Erro: {e}")
+            self._models_by_level[user_level] = model
+        return model
+
+    # Mensagem de boas-vindas usada quando não há mensagem do usuário para responder
+    DEFAULT_WELCOME = (
+        "Olá! Sou seu tutor de inglês. Como posso ajudar você com seu aprendizado hoje? "
+        "Podemos praticar gramática, vocabulário, pronúncia ou conversar sobre algum tema específico."
+    )
+
+    # Resposta do modelo usada para fechar o turno de contexto no histórico
+    INSTRUCTION_ACK = "Entendido."
+
+    @staticmethod
+    def _append_turn(history: List[Dict[str, Any]], role: str, text: str) -> None:
+        """Adiciona um turno ao histórico, unindo turnos consecutivos do mesmo papel"""
+        if history and history[-1]["role"] == role:
+            history[-1]["parts"].append(text)
+        else:
+            history.append({"role": role, "parts": [text]})
+
+    def _start_chat(
+        self, messages: List[Dict[str, str]], user_level: str
+    ) -> Tuple[ChatSession, Optional[List[str]]]:
+        """
+        Inicia um chat com as instruções e o histórico de mensagens já montados,
+        sem chamadas à API antes do envio do prompt final.
+
+        Returns:
+            O chat preparado e as partes do prompt final a ser enviado, ou None se
+            a última mensagem não for do usuário
+        """
+        # As instruções fixas vão no system_instruction do modelo do nível
+        model = self._model_for(user_level)
+        history: List[Dict[str, Any]] = []
+
+        # Extrair a mensagem do sistema se existir
+        system_content = ""
+        for msg in messages:
+            if msg["role"] == "system":
+                system_content = msg["content"]
+                break
+
+        # Adicionar o contexto do sistema se existir
+        if system_content:
+            history.append(
+                {"role": "user", "parts": [f"Contexto adicional: {system_content}"]}
+            )
+            history.append({"role": "model", "parts": [self.INSTRUCTION_ACK]})
+
+        # Processar mensagens do usuário e assistente
+        user_messages = [msg for msg in messages if msg["role"] != "system"]
+
+        # As mensagens anteriores à última entram diretamente no histórico
+        for msg in user_messages[:-1]:
+            if msg["role"] == "user":
+                self._append_turn(history, "user", f"[ALUNO]: {msg['content']}")
+            else:
+                self._append_turn(history, "model", msg["content"])
+
+        # Preparar a última mensagem do usuário se existir
+        if user_messages and user_messages[-1]["role"] == "user":
+            last_message = user_messages[-1]["content"]
+            prompt = [
+                f"[ALUNO]: {last_message}\n\nResponda como TUTOR DE INGLÊS em português, "
+                f"lembrando que você é o professor ajudando o aluno. NUNCA responda como se você fosse quem "
+                f"precisa aprender inglês."
+            ]
+
+            # Mensagens do aluno ainda sem resposta seguem junto com o prompt final;
+            # sem mensagem de sistema e sem turnos anteriores, o histórico é vazio
+            if history and history[-1]["role"] == "user":
+                prompt = history.pop()["parts"] + prompt
+
+            return model.start_chat(history=history), prompt
+
+        return model.start_chat(history=history), None
 
     async def generate_response(
         self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
     ) -> str:
         """Gera uma resposta com base no histórico de mensagens e nível do usuário"""
         try:
-            # Definir uma mensagem de sistema clara e explícita
-            strong_instructions = (
-                "INSTRUÇÕES IMPORTANTES: Você é o VerbaMentor, um tutor de inglês que ajuda alunos brasileiros. "
-                f"O aluno está no nível {user_level}. "
-                "SEMPRE responda em português brasileiro exceto ao demonstrar exemplos em inglês. "
-                "Você NUNCA deve responder como se você fosse o aluno que está aprendendo inglês. "
-                "Você NUNCA deve dizer frases como 'não preciso de ajuda com meu inglês' ou similares. "
-                "Você é o PROFESSOR aqui para ensinar, e deve assumir que qualquer mensagem do usuário "
-                "é de um ALUNO que precisa aprender inglês. Se a mensagem inicial parecer oferecer ajuda "
-                "a você, considere que é apenas uma pergunta sobre um tema de inglês e responda como TUTOR."
-            )
-
-            # Inicializar um novo chat
-            chat = self.model.start_chat(history=[])
-
-            # Enviar primeiramente as instruções fortes
-            chat.send_message(strong_instructions)
-
-            # Extrair a mensagem do sistema se existir
-            system_content = ""
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_content = msg["content"]
-                    break
-
-            # Enviar o contexto do sistema se existir
-            if system_content:
-                chat.send_message(f"Contexto adicional: {system_content}")
-
-            # Processar mensagens do usuário e assistente
-            user_messages = [msg for msg in messages if msg["role"] != "system"]
-
-            # Se houver mensagens anteriores, processar as mensagens exceto a última
-            if len(user_messages) > 1:
-                for msg in user_messages[:-1]:
-                    role = msg["role"]
-                    content = msg["content"]
-
-                    if role == "user":
-                        chat.send_message(f"[ALUNO]: {content}")
-                    else:
-                        # Apenas adicionar ao histórico, não gerar resposta
-                        chat.history.append({"role": "model", "parts": [content]})
-
-            # Processar a última mensagem do usuário se existir
-            if user_messages and user_messages[-1]["role"] == "user":
-                last_message = user_messages[-1]["content"]
-                response = chat.send_message(
-                    f"[ALUNO]: {last_message}\n\nResponda como TUTOR DE INGLÊS em português, "
-                    f"lembrando que você é o professor ajudando o aluno. NUNCA responda como se você fosse quem "
-                    f"precisa aprender inglês."
-                )
-                return response.text
+            chat, prompt = self._start_chat(messages, user_level)
 
             # Se não houver mensagem do usuário, gerar uma mensagem de boas-vindas
-            default_welcome = (
-                "Olá! Sou seu tutor de inglês. Como posso ajudar você com seu aprendizado hoje? "
-                "Podemos praticar gramática, vocabulário, pronúncia ou conversar sobre algum tema específico."
-            )
+            if prompt is None:
+                return self.DEFAULT_WELCOME
+
+            response = await chat.send_message_async(prompt)
+            return response.text
+
+        except Exception:
+            logger.exception("Erro ao gerar resposta com Gemini")
+            return self.FALLBACK_RESPONSE
+
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Gera a resposta em partes à medida que o Gemini as produz"""
+        has_output = False
+        try:
+            chat, prompt = self._start_chat(messages, user_level)
+
+            if prompt is None:
+                yield self.DEFAULT_WELCOME
+                return
 
-            return default_welcome
+            response = await chat.send_message_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    has_output = True
+                    yield chunk.text
 
         except Exception as e:
-            print(f"Erro ao gerar resposta com Gemini: {e}")
-            return "Desculpe, não consegui gerar uma resposta. Por favor, tente novamente mais tarde."
+            logger.exception("Erro ao gerar resposta com Gemini")
+            # Se parte da resposta já foi enviada, não a mistura com a mensagem de erro
+            if has_output:
+                raise StreamInterruptedError("Resposta do Gemini interrompida") from e
+            yield self.FALLBACK_RESPONSE
 
     # Os outros métodos da interface AIService são implementados como métodos vazios
     # já que vamos usar o GroqService para essas funcionalidades
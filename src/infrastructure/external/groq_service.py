@@ -1,16 +1,127 @@
-import json
+import asyncio
+import copy
+import hashlib
+import logging
 import os
-from typing import Any, Dict, List, Optional
-
-import requests
-
-from src.domain.interfaces.ai_service import AIService
+import random
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
+import orjson
+
+from src.application.services.ttl_cache import TTLCache
+from src.domain.interfaces.ai_service import AIService, StreamInterruptedError
+
+logger = logging.getLogger(__name__)
+
+# Glossário local de frases curtas comuns, consultado antes da API de tradução
+_GLOSSARY_PATH = os.path.join(os.path.dirname(__file__), "data", "glossary.json")
+_GLOSSARY_MAX_LENGTH = 64
+
+# Instruções do tutor; o nível do estudante é acrescentado ao final
+_TUTOR_SYSTEM_PROMPT = (
+    "Você é um tutor de inglês chamado VerbaMentor que ajuda estudantes brasileiros a aprender inglês. "
+    "NUNCA responda como se você fosse o aluno ou como se você precisasse de ajuda com inglês. "
+    "Seu papel é ensinar inglês ao aluno, não o contrário. "
+    "Se o aluno perguntar se você precisa de ajuda com inglês, explique educadamente que você é o tutor "
+    "e está aqui para ajudá-lo a aprender inglês. "
+)
+
+# Mensagens de sistema fixas de cada funcionalidade
+_LESSON_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Você é um especialista em criar materiais didáticos para ensino de inglês.",
+}
+_EXERCISES_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Você é um especialista em criar exercícios para ensino de inglês.",
+}
+_EVALUATION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Você é um professor de inglês avaliando respostas de alunos.",
+}
+_PRONUNCIATION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Você é um especialista em pronúncia de inglês.",
+}
+_VOCABULARY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Você é um especialista em ensino de vocabulário de inglês.",
+}
+_TRANSLATE_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um tradutor profissional. Responda apenas com o texto traduzido, "
+        "sem comentários nem formatação markdown."
+    ),
+}
+
+# Modelos dos prompts de cada funcionalidade, preenchidos com str.format
+_LESSON_PROMPT = (
+    "Crie uma lição de inglês completa sobre '{topic}'. "
+    "Nível: {difficulty}. Categoria: {category}. "
+    "A lição deve incluir: introdução, conteúdo principal, exemplos, "
+    "prática e conclusão. Forneça também um título adequado e "
+    "uma breve descrição. Responda em formato JSON com as seguintes chaves: "
+    "title, description, introduction, main_content, examples, practice, conclusion."
+)
+_EXERCISES_PROMPT = (
+    "Com base no seguinte conteúdo de lição de inglês:\n\n{lesson_content}\n\n"
+    "Crie {num_exercises} exercícios de nível {difficulty}. "
+    "Inclua uma mistura de perguntas de múltipla escolha e perguntas abertas. "
+    "Para cada exercício, forneça: pergunta, opções (quando aplicável), "
+    "resposta correta e explicação. Responda em formato JSON como um array de exercícios."
+)
+_EVALUATION_PROMPT = (
+    "Avalie a resposta de um estudante de inglês de nível {user_level}.\n\n"
+    "Contexto ou pergunta: {expected_pattern}\n\n"
+    "Resposta do estudante: {user_response}\n\n"
+    "Forneça uma avaliação detalhada incluindo: correções gramaticais, "
+    "avaliação de vocabulário, sugestões de melhoria, e uma pontuação de 0 a 1 "
+    "para gramática e adequação da resposta. Responda em formato JSON com as seguintes chaves: "
+    "feedback, grammar_corrections, vocabulary_suggestions, grammar_score, adequacy_score."
+)
+_PRONUNCIATION_PROMPT = (
+    "Avalie a pronúncia de um estudante de inglês.\n\n"
+    "Texto esperado: {expected_text}\n\n"
+    "Texto transcrito do áudio: {audio_transcription}\n\n"
+    "Compare os dois textos e identifique erros de pronúncia, palavras omitidas ou adicionadas. "
+    "Forneça feedback detalhado, sugestões de melhoria, e uma pontuação de 0 a 1. "
+    "Responda em formato JSON com as seguintes chaves: pronunciation_feedback, "
+    "identified_errors, improvement_suggestions, pronunciation_score."
+)
+_VOCABULARY_PROMPT = (
+    "A partir do seguinte texto em inglês:\n\n{text}\n\n"
+    "Extraia até {max_items} palavras ou expressões importantes para um estudante de nível {user_level}. "
+    "Para cada item, forneça: a palavra/expressão, definição em inglês, definição em português, "
+    "e um exemplo de uso em uma frase. Responda em formato JSON como um array de itens."
+)
+_TRANSLATE_PROMPT = "Traduza o seguinte texto para {target_language}:\n\n{text}"
 
 
 class GroqService(AIService):
     """Implementação do serviço de AI usando a API da Groq"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, redis: Optional[Any] = None):
+        """
+        Inicializa o serviço.
+
+        Args:
+            api_key: Chave da API da Groq
+            redis: Cliente `redis.asyncio.Redis` opcional, usado como cache
+                compartilhado entre processos
+        """
         self.api_key = api_key or os.getenv(
             "OPENAI_API_KEY"
         )  # Reusa a variável de ambiente
@@ -23,92 +134,373 @@ class GroqService(AIService):
             "Content-Type": "application/json",
         }
 
-        # Modelo padrão da Groq
-        self.model = "llama2-70b-4096"  # ou "mixtral-8x7b-32768" para contextos maiores
+        # Modelos da Groq: o menor atende tarefas simples com latência bem mais baixa
+        self._models = {
+            "small": "llama-3.1-8b-instant",
+            "large": "llama-3.3-70b-versatile",
+        }
+        self.model = self._models["large"]
 
-    async def generate_response(
-        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
-    ) -> str:
-        """Gera uma resposta com base no histórico de mensagens e nível do usuário"""
+        # Sessão HTTP compartilhada, criada sob demanda dentro do loop de eventos
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+
+        # Limita as requisições simultâneas, inclusive nas chamadas em lote
+        self._semaphore = asyncio.Semaphore(25)
+
+        # Novas tentativas quando a API responde 429 (limite de requisições)
+        self.max_retries = 5
+        self.max_retry_delay = 60.0
+
+        # Caches das chamadas determinísticas, evitando idas repetidas à API
+        self._caches = {
+            "translate": TTLCache(maxsize=2048, ttl=86400),
+            "lesson": TTLCache(maxsize=512, ttl=3600),
+            "exercises": TTLCache(maxsize=512, ttl=3600),
+            "vocabulary": TTLCache(maxsize=512, ttl=3600),
+        }
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.redis = redis
+
+        # Mensagens de sistema do tutor já montadas, por nível do usuário
+        self._system_templates: Dict[str, Dict[str, str]] = {}
+
+        self._glossary = self._load_glossary()
+
+    @staticmethod
+    def _load_glossary() -> Dict[Tuple[str, str], str]:
+        """Carrega o glossário local indexado por (texto, idioma de destino)"""
+        try:
+            with open(_GLOSSARY_PATH, "rb") as file:
+                data = orjson.loads(file.read())
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning("Erro ao carregar o glossário: %s", e)
+            return {}
+
+        return {
+            (source.casefold(), target_language): translation
+            for target_language, entries in data.items()
+            for source, translation in entries.items()
+        }
+
+    def _lookup_glossary(self, text: str, target_language: str) -> Optional[str]:
+        """Traduz textos curtos pelo glossário, preservando pontuação final e maiúscula inicial"""
+        stripped = text.strip()
+        if not stripped or len(stripped) >= _GLOSSARY_MAX_LENGTH:
+            return None
+
+        core = stripped.rstrip(".!?")
+        translation = self._glossary.get((core.casefold(), target_language.lower()))
+        if translation is None:
+            return None
+
+        if core[:1].isupper():
+            translation = translation[:1].upper() + translation[1:]
+        return translation + stripped[len(core) :]
+
+    async def _cached(
+        self,
+        cache: TTLCache,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        redis_ttl: Optional[int] = None,
+    ) -> Any:
+        """
+        Retorna o resultado em cache ou executa `fetch`, garantindo que chamadas
+        simultâneas com a mesma chave compartilhem uma única requisição.
+        Com `redis_ttl`, o Redis é consultado antes da API quando configurado.
+        """
+        result = cache.get(key)
+        if result is None:
+            task = self._inflight.get(key)
+            if task is None:
+                if self.redis is not None and redis_ttl:
+                    task = asyncio.ensure_future(
+                        self._cached_shared(key, fetch, redis_ttl)
+                    )
+                else:
+                    task = asyncio.ensure_future(fetch())
+                self._inflight[key] = task
+
+                def _store(done: asyncio.Future) -> None:
+                    self._inflight.pop(key, None)
+                    # Resultados vazios ou com erro não são armazenados
+                    if not done.cancelled() and done.exception() is None:
+                        if done.result():
+                            cache.set(key, done.result())
+
+                task.add_done_callback(_store)
+
+            result = await asyncio.shield(task)
+
+        # Cópia para que alterações feitas pelo chamador não afetem o cache
+        return copy.deepcopy(result)
+
+    async def _cached_shared(
+        self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int
+    ) -> Any:
+        """Consulta o cache do Redis e, em caso de falta, executa `fetch` e o preenche"""
+        redis_key = f"groq:{key}"
         try:
-            # Adicionar instruções de sistema claras para evitar confusão de papéis
+            raw = await self.redis.get(redis_key)
+            if raw:
+                return orjson.loads(raw)
+        except Exception as e:
+            # Falhas do Redis não podem impedir a chamada à API
+            logger.warning("Erro ao ler o cache do Redis: %s", e)
+
+        result = await fetch()
+        if result:
+            try:
+                await self.redis.set(redis_key, orjson.dumps(result), ex=ttl)
+            except Exception as e:
+                logger.warning("Erro ao gravar no cache do Redis: %s", e)
+        return result
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Retorna a sessão HTTP compartilhada, reaproveitando conexões keep-alive"""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        headers=self.headers,
+                        connector=aiohttp.TCPConnector(limit=50, limit_per_host=20),
+                    )
+        return self._session
+
+    def _retry_delay(self, retry_after: Optional[str], attempt: int) -> float:
+        """Calcula a espera antes da próxima tentativa, respeitando o Retry-After"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_delay)
+            except ValueError:
+                pass
+        return min(2**attempt + random.uniform(0, 1), self.max_retry_delay)
+
+    @asynccontextmanager
+    async def _request(
+        self, body: bytes, hold_slot: bool = True
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Abre uma requisição de chat completion com o corpo já serializado e fornece
+        a resposta bem-sucedida, tentando novamente com espera exponencial quando
+        a API responde 429. As novas tentativas reutilizam os mesmos bytes.
+
+        Args:
+            body: Corpo da requisição já serializado
+            hold_slot: Se falso, a vaga do semáforo é liberada assim que os cabeçalhos
+                chegam, para que o consumo lento de um streaming não reduza a
+                concorrência das demais chamadas; a conexão do pool segue ocupada
+                até o fim da leitura
+        """
+        session = await self._get_session()
+        for attempt in range(self.max_retries + 1):
+            await self._semaphore.acquire()
+            slot_held = True
+            try:
+                async with session.post(
+                    f"{self.api_base}/chat/completions", data=body
+                ) as response:
+                    if response.status != 429 or attempt == self.max_retries:
+                        response.raise_for_status()
+                        if not hold_slot:
+                            self._semaphore.release()
+                            slot_held = False
+                        yield response
+                        return
+                    delay = self._retry_delay(
+                        response.headers.get("Retry-After"), attempt
+                    )
+            finally:
+                if slot_held:
+                    self._semaphore.release()
+
+            # A espera acontece fora do semáforo para não bloquear outras requisições
+            logger.warning(
+                "Limite de requisições da Groq atingido, nova tentativa em %.1fs", delay
+            )
+            await asyncio.sleep(delay)
+
+    async def _post_json(self, body: bytes) -> Dict[str, Any]:
+        """Envia uma requisição de chat completion e retorna o corpo da resposta"""
+        async with self._request(body) as response:
+            return orjson.loads(await response.read())
+
+    @staticmethod
+    def _as_list(data: Any, key: str) -> List[Dict[str, Any]]:
+        """Garante que o retorno seja uma lista, aceitando o objeto {key: [...]}"""
+        if isinstance(data, dict) and key in data:
+            return data[key]
+        elif isinstance(data, list):
+            return data
+        else:
+            return []
+
+    async def _chat(
+        self,
+        *,
+        system: Dict[str, str],
+        user: str,
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        model: str = "large",
+        cache: Optional[str] = None,
+        redis_ttl: Optional[int] = None,
+    ) -> Any:
+        """
+        Envia um par de mensagens (sistema e usuário) e retorna o conteúdo da resposta.
+
+        Args:
+            system: Mensagem de sistema da funcionalidade
+            user: Prompt do usuário
+            max_tokens: Limite de tokens gerados
+            temperature: Temperatura da amostragem
+            json_mode: Se verdadeiro, exige JSON e retorna o conteúdo já decodificado
+            model: Porte do modelo usado ("small" ou "large")
+            cache: Nome do cache em memória usado para a chamada, se houver
+            redis_ttl: Tempo de vida no Redis, quando o cache compartilhado é usado
+
+        Returns:
+            O texto da resposta ou o objeto JSON decodificado
+        """
+        payload = {
+            "model": self._models[model],
+            "messages": [system, {"role": "user", "content": user}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+            # Impede que o modelo continue com blocos markdown depois do JSON
+            payload["stop"] = ["```"]
+
+        # O corpo é serializado uma única vez: serve para o envio, as novas
+        # tentativas e a chave do cache
+        body = orjson.dumps(payload)
+
+        async def fetch() -> Any:
+            result = await self._post_json(body)
+            # Tokens gerados por chamada, usados para calibrar os limites de max_tokens
+            usage = result.get("usage") or {}
+            logger.debug(
+                "Groq %s: %s tokens gerados (limite %s)",
+                payload["model"],
+                usage.get("completion_tokens"),
+                max_tokens,
+            )
+            content = result["choices"][0]["message"]["content"]
+            return orjson.loads(content) if json_mode else content
+
+        if cache is None:
+            return await fetch()
+
+        key = f"{cache}:{hashlib.blake2b(body, digest_size=16).hexdigest()}"
+        return await self._cached(self._caches[cache], key, fetch, redis_ttl=redis_ttl)
+
+    async def aclose(self) -> None:
+        """Fecha a sessão HTTP compartilhada"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _system_for(self, user_level: str) -> Dict[str, str]:
+        """Retorna a mensagem de sistema do tutor para o nível, montada uma única vez"""
+        system_message = self._system_templates.get(user_level)
+        if system_message is None:
             system_message = {
                 "role": "system",
-                "content": (
-                    "Você é um tutor de inglês chamado VerbaMentor que ajuda estudantes brasileiros a aprender inglês. "
-                    f"O estudante tem nível {user_level}. "
-                    "NUNCA responda como se você fosse o aluno ou como se você precisasse de ajuda com inglês. "
-                    "Seu papel é ensinar inglês ao aluno, não o contrário. "
-                    "Se o aluno perguntar se você precisa de ajuda com inglês, explique educadamente que você é o tutor "
-                    "e está aqui para ajudá-lo a aprender inglês."
-                ),
+                "content": _TUTOR_SYSTEM_PROMPT
+                + f"O estudante tem nível {user_level}.",
             }
+            self._system_templates[user_level] = system_message
+        return system_message
 
-            # Verificar se já existe uma mensagem de sistema e substituí-la ou adicionar nova
-            has_system_message = False
-            for i, msg in enumerate(messages):
-                if msg["role"] == "system":
-                    messages[i] = system_message
-                    has_system_message = True
-                    break
-
-            if not has_system_message:
+    async def generate_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> str:
+        """Gera uma resposta com base no histórico de mensagens e nível do usuário"""
+        try:
+            return "".join(
+                [
+                    chunk
+                    async for chunk in self.stream_response(
+                        messages=messages, user_level=user_level, max_tokens=max_tokens
+                    )
+                ]
+            )
+        except StreamInterruptedError:
+            # Uma resposta truncada não deve parecer completa para quem chama
+            return self.FALLBACK_RESPONSE
+
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Gera a resposta em partes à medida que a Groq as envia (SSE)"""
+        has_output = False
+        try:
+            # Substituir a mensagem de sistema existente ou adicionar a do tutor
+            system_message = self._system_for(user_level)
+            if messages and messages[0]["role"] == "system":
+                messages[0] = system_message
+            else:
                 messages.insert(0, system_message)
 
-            url = f"{self.api_base}/chat/completions"
             payload = {
                 "model": self.model,
                 "messages": messages,
                 "max_tokens": max_tokens,
                 "temperature": 0.7,
+                "stream": True,
             }
 
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-
-            return result["choices"][0]["message"]["content"]
+            # O streaming é lido no ritmo de quem consome (incluindo os envios ao
+            # Discord), então não segura a vaga do semáforo durante a leitura
+            async with self._request(
+                orjson.dumps(payload), hold_slot=False
+            ) as response:
+                # Cada evento tem o formato "data: {...}" e o fluxo termina com "data: [DONE]"
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+
+                    choices = orjson.loads(data).get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        has_output = True
+                        yield content
         except Exception as e:
-            print(f"Erro ao gerar resposta: {e}")
-            return "Desculpe, não consegui gerar uma resposta. Por favor, tente novamente mais tarde."
+            logger.exception("Erro ao gerar resposta")
+            # Se parte da resposta já foi enviada, não a mistura com a mensagem de erro
+            if has_output:
+                raise StreamInterruptedError("Resposta da Groq interrompida") from e
+            yield self.FALLBACK_RESPONSE
 
     async def generate_lesson_content(
         self, topic: str, difficulty: str, category: str
     ) -> Dict[str, Any]:
         """Gera conteúdo para uma lição com base no tópico, dificuldade e categoria"""
-        prompt = (
-            f"Crie uma lição de inglês completa sobre '{topic}'. "
-            f"Nível: {difficulty}. Categoria: {category}. "
-            "A lição deve incluir: introdução, conteúdo principal, exemplos, "
-            "prática e conclusão. Forneça também um título adequado e "
-            "uma breve descrição. Responda em formato JSON com as seguintes chaves: "
-            "title, description, introduction, main_content, examples, practice, conclusion."
+        prompt = _LESSON_PROMPT.format(
+            topic=topic, difficulty=difficulty, category=category
         )
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em criar materiais didáticos para ensino de inglês.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1500,
-                "temperature": 0.7,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao gerar conteúdo da lição: {e}")
+            return await self._chat(
+                system=_LESSON_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=1200,
+                temperature=0.7,
+                json_mode=True,
+                cache="lesson",
+                redis_ttl=86400,
+            )
+        except Exception:
+            logger.exception("Erro ao gerar conteúdo da lição")
             return {
                 "title": f"Lição sobre {topic}",
                 "description": "Conteúdo não disponível no momento.",
@@ -123,86 +515,47 @@ class GroqService(AIService):
         self, lesson_content: str, num_exercises: int = 5, difficulty: str = "medium"
     ) -> List[Dict[str, Any]]:
         """Gera exercícios baseados no conteúdo da lição"""
-        prompt = (
-            f"Com base no seguinte conteúdo de lição de inglês:\n\n{lesson_content}\n\n"
-            f"Crie {num_exercises} exercícios de nível {difficulty}. "
-            "Inclua uma mistura de perguntas de múltipla escolha e perguntas abertas. "
-            "Para cada exercício, forneça: pergunta, opções (quando aplicável), "
-            "resposta correta e explicação. Responda em formato JSON como um array de exercícios."
+        prompt = _EXERCISES_PROMPT.format(
+            lesson_content=lesson_content,
+            num_exercises=num_exercises,
+            difficulty=difficulty,
         )
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em criar exercícios para ensino de inglês.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1500,
-                "temperature": 0.7,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-
-            content = result["choices"][0]["message"]["content"]
-            exercises_data = json.loads(content)
-
-            # Garantir que o retorno seja uma lista
-            if isinstance(exercises_data, dict) and "exercises" in exercises_data:
-                return exercises_data["exercises"]
-            elif isinstance(exercises_data, list):
-                return exercises_data
-            else:
-                return []
-        except Exception as e:
-            print(f"Erro ao gerar exercícios: {e}")
+            exercises_data = await self._chat(
+                system=_EXERCISES_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=1200,
+                temperature=0.7,
+                json_mode=True,
+                cache="exercises",
+            )
+            return self._as_list(exercises_data, "exercises")
+        except Exception:
+            logger.exception("Erro ao gerar exercícios")
             return []
 
     async def evaluate_response(
         self, expected_pattern: str, user_response: str, user_level: str
     ) -> Dict[str, Any]:
         """Avalia a resposta do usuário em relação a um padrão esperado"""
-        prompt = (
-            f"Avalie a resposta de um estudante de inglês de nível {user_level}.\n\n"
-            f"Contexto ou pergunta: {expected_pattern}\n\n"
-            f"Resposta do estudante: {user_response}\n\n"
-            "Forneça uma avaliação detalhada incluindo: correções gramaticais, "
-            "avaliação de vocabulário, sugestões de melhoria, e uma pontuação de 0 a 1 "
-            "para gramática e adequação da resposta. Responda em formato JSON com as seguintes chaves: "
-            "feedback, grammar_corrections, vocabulary_suggestions, grammar_score, adequacy_score."
+        prompt = _EVALUATION_PROMPT.format(
+            user_level=user_level,
+            expected_pattern=expected_pattern,
+            user_response=user_response,
         )
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Você é um professor de inglês avaliando respostas de alunos.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.3,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-
-            content = result["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao avaliar resposta: {e}")
+            return await self._chat(
+                system=_EVALUATION_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=600,
+                temperature=0.3,
+                model="small",
+                json_mode=True,
+            )
+        except Exception:
+            logger.exception("Erro ao avaliar resposta")
             return {
                 "feedback": "Não foi possível avaliar a resposta.",
                 "grammar_corrections": [],
@@ -215,40 +568,21 @@ class GroqService(AIService):
         self, expected_text: str, audio_transcription: str
     ) -> Dict[str, Any]:
         """Avalia a pronúncia do usuário comparando o texto esperado com a transcrição do áudio"""
-        prompt = (
-            f"Avalie a pronúncia de um estudante de inglês.\n\n"
-            f"Texto esperado: {expected_text}\n\n"
-            f"Texto transcrito do áudio: {audio_transcription}\n\n"
-            "Compare os dois textos e identifique erros de pronúncia, palavras omitidas ou adicionadas. "
-            "Forneça feedback detalhado, sugestões de melhoria, e uma pontuação de 0 a 1. "
-            "Responda em formato JSON com as seguintes chaves: pronunciation_feedback, "
-            "identified_errors, improvement_suggestions, pronunciation_score."
+        prompt = _PRONUNCIATION_PROMPT.format(
+            expected_text=expected_text, audio_transcription=audio_transcription
         )
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em pronúncia de inglês.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 800,
-                "temperature": 0.3,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-
-            content = result["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao avaliar pronúncia: {e}")
+            return await self._chat(
+                system=_PRONUNCIATION_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=500,
+                temperature=0.3,
+                model="small",
+                json_mode=True,
+            )
+        except Exception:
+            logger.exception("Erro ao avaliar pronúncia")
             return {
                 "pronunciation_feedback": "Não foi possível avaliar a pronúncia.",
                 "identified_errors": [],
@@ -260,68 +594,101 @@ class GroqService(AIService):
         self, text: str, user_level: str, max_items: int = 10
     ) -> List[Dict[str, str]]:
         """Gera uma lista de vocabulário a partir de um texto, adequada ao nível do usuário"""
-        prompt = (
-            f"A partir do seguinte texto em inglês:\n\n{text}\n\n"
-            f"Extraia até {max_items} palavras ou expressões importantes para um estudante de nível {user_level}. "
-            "Para cada item, forneça: a palavra/expressão, definição em inglês, definição em português, "
-            "e um exemplo de uso em uma frase. Responda em formato JSON como um array de itens."
+        prompt = _VOCABULARY_PROMPT.format(
+            text=text, max_items=max_items, user_level=user_level
         )
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em ensino de vocabulário de inglês.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.5,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-
-            content = result["choices"][0]["message"]["content"]
-            vocabulary_data = json.loads(content)
-
-            # Garantir que o retorno seja uma lista
-            if isinstance(vocabulary_data, dict) and "vocabulary" in vocabulary_data:
-                return vocabulary_data["vocabulary"]
-            elif isinstance(vocabulary_data, list):
-                return vocabulary_data
-            else:
-                return []
-        except Exception as e:
-            print(f"Erro ao gerar lista de vocabulário: {e}")
+            vocabulary_data = await self._chat(
+                system=_VOCABULARY_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=800,
+                temperature=0.5,
+                json_mode=True,
+                cache="vocabulary",
+            )
+            return self._as_list(vocabulary_data, "vocabulary")
+        except Exception:
+            logger.exception("Erro ao gerar lista de vocabulário")
             return []
 
     async def translate_text(self, text: str, target_language: str = "pt-br") -> str:
         """Traduz um texto para o idioma de destino"""
-        prompt = f"Traduza o seguinte texto para {target_language}:\n\n{text}"
+        # Frases curtas e comuns são respondidas pelo glossário, sem chamar a API
+        translation = self._lookup_glossary(text, target_language)
+        if translation is not None:
+            return translation
+
+        prompt = _TRANSLATE_PROMPT.format(target_language=target_language, text=text)
 
         try:
-            url = f"{self.api_base}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": "Você é um tradutor profissional."},
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.3,
-            }
+            return await self._chat(
+                system=_TRANSLATE_SYSTEM_MESSAGE,
+                user=prompt,
+                max_tokens=1000,
+                temperature=0.3,
+                model="small",
+                cache="translate",
+                redis_ttl=7 * 86400,
+            )
+        except Exception:
+            logger.exception("Erro ao traduzir texto")
+            return f"Erro na tradução: {text}"
+
+    async def translate_many(
+        self, texts: List[str], target_language: str = "pt-br"
+    ) -> List[str]:
+        """Traduz vários textos em paralelo, preservando a ordem"""
+        return await asyncio.gather(
+            *(self.translate_text(text, target_language) for text in texts)
+        )
 
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+    async def generate_vocabulary_lists(
+        self, texts: List[str], user_level: str, max_items: int = 10
+    ) -> List[List[Dict[str, str]]]:
+        """Gera listas de vocabulário para vários textos em paralelo"""
+        return await asyncio.gather(
+            *(
+                self.generate_vocabulary_list(text, user_level, max_items)
+                for text in texts
+            )
+        )
 
-            return result["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"Erro ao traduzir texto: {e}")
-            return f"Erro na tradução: {text}"
+    async def generate_exercises_many(
+        self,
+        lesson_contents: List[str],
+        num_exercises: int = 5,
+        difficulty: str = "medium",
+    ) -> List[List[Dict[str, Any]]]:
+        """Gera exercícios para várias lições em paralelo"""
+        return await asyncio.gather(
+            *(
+                self.generate_exercises(content, num_exercises, difficulty)
+                for content in lesson_contents
+            )
+        )
+
+    async def evaluate_responses(
+        self, items: List[Tuple[str, str]], user_level: str
+    ) -> List[Dict[str, Any]]:
+        """Avalia vários pares (padrão esperado, resposta) em paralelo"""
+        return await asyncio.gather(
+            *(
+                self.evaluate_response(expected_pattern, user_response, user_level)
+                for expected_pattern, user_response in items
+            )
+        )
+
+
+# Instância compartilhada, para que a sessão HTTP e o cache sejam reaproveitados
+_instance: Optional[GroqService] = None
+
+
+def get_groq_service(
+    api_key: Optional[str] = None, redis: Optional[Any] = None
+) -> GroqService:
+    """Retorna a instância compartilhada do GroqService, criando-a na primeira chamada"""
+    global _instance
+    if _instance is None:
+        _instance = GroqService(api_key=api_key, redis=redis)
+    return _instance
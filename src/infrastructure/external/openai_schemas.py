@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, ConfigDict
+
+
+class _StrictModel(BaseModel):
+    """Base dos esquemas: o modo estrito da OpenAI exige objetos fechados"""
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class LessonContent(_StrictModel):
+    title: str
+    description: str
+    introduction: str
+    main_content: str
+    examples: str
+    practice: str
+    conclusion: str
+
+
+class Exercise(_StrictModel):
+    question: str
+    # Perguntas abertas retornam null, já que o modo estrito exige todos os campos
+    options: Optional[List[str]]
+    correct_answer: str
+    explanation: str
+
+
+class ExerciseList(_StrictModel):
+    exercises: List[Exercise]
+
+
+class Evaluation(_StrictModel):
+    feedback: str
+    grammar_corrections: List[str]
+    vocabulary_suggestions: List[str]
+    grammar_score: float
+    adequacy_score: float
+
+
+class PronunciationEvaluation(_StrictModel):
+    pronunciation_feedback: str
+    identified_errors: List[str]
+    improvement_suggestions: List[str]
+    pronunciation_score: float
+
+
+class VocabItem(_StrictModel):
+    word: str
+    definition: str
+    translation: str
+    example: str
+
+
+class VocabularyList(_StrictModel):
+    vocabulary: List[VocabItem]
+
+
+def response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Monta o `response_format` de saída estruturada estrita para o modelo informado"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "schema": model.model_json_schema(),
+            "strict": True,
+        },
+    }
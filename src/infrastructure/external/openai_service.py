@@ -1,10 +1,109 @@
-import json
+import asyncio
+import copy
+import hashlib
+import logging
 import os
+import random
 from typing import Any, Dict, List, Optional
 
+import httpx
 import openai
+import orjson
 
+from src.application.services.ttl_cache import TTLCache
 from src.domain.interfaces.ai_service import AIService
+from src.infrastructure.external.openai_schemas import (
+    Evaluation,
+    ExerciseList,
+    LessonContent,
+    PronunciationEvaluation,
+    VocabularyList,
+    response_format,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mensagens de sistema fixas de cada funcionalidade, montadas uma única vez. Elas
+# formam o início de cada requisição, idêntico entre chamadas, para aproveitar o
+# cache de prefixo de prompts da OpenAI; os dados variáveis vão apenas na mensagem
+# do usuário.
+_LESSON_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um especialista em criar materiais didáticos para ensino de inglês. "
+        "Crie uma lição de inglês completa sobre o tópico, nível e categoria informados pelo usuário. "
+        "A lição deve incluir: introdução, conteúdo principal, exemplos, "
+        "prática e conclusão. Forneça também um título adequado e "
+        "uma breve descrição. Responda em formato JSON com as seguintes chaves: "
+        "title, description, introduction, main_content, examples, practice, conclusion. "
+        "Seja conciso, sem texto de preenchimento."
+    ),
+}
+_EXERCISES_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um especialista em criar exercícios para ensino de inglês. "
+        "Com base no conteúdo de lição de inglês informado pelo usuário, crie o número "
+        "de exercícios pedido, no nível indicado. "
+        "Inclua uma mistura de perguntas de múltipla escolha e perguntas abertas. "
+        "Para cada exercício, forneça: pergunta, opções (quando aplicável), "
+        "resposta correta e explicação. Responda em formato JSON com a chave exercises, "
+        "um array de exercícios com as chaves question, options, correct_answer e explanation. "
+        "Seja conciso, sem texto de preenchimento."
+    ),
+}
+_EVALUATION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um professor de inglês avaliando respostas de alunos. "
+        "Avalie a resposta do estudante, considerando o nível e o contexto ou pergunta informados. "
+        "Forneça uma avaliação detalhada incluindo: correções gramaticais, "
+        "avaliação de vocabulário, sugestões de melhoria, e uma pontuação de 0 a 1 "
+        "para gramática e adequação da resposta. Responda em formato JSON com as seguintes chaves: "
+        "feedback, grammar_corrections, vocabulary_suggestions, grammar_score, adequacy_score. "
+        "Seja conciso, sem texto de preenchimento."
+    ),
+}
+_PRONUNCIATION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um especialista em pronúncia de inglês. "
+        "Avalie a pronúncia de um estudante de inglês comparando o texto esperado "
+        "com o texto transcrito do áudio. "
+        "Identifique erros de pronúncia, palavras omitidas ou adicionadas. "
+        "Forneça feedback detalhado, sugestões de melhoria, e uma pontuação de 0 a 1. "
+        "Responda em formato JSON com as seguintes chaves: pronunciation_feedback, "
+        "identified_errors, improvement_suggestions, pronunciation_score. "
+        "Seja conciso, sem texto de preenchimento."
+    ),
+}
+_VOCABULARY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um especialista em ensino de vocabulário de inglês. "
+        "A partir do texto em inglês informado, extraia até o máximo de itens pedido: "
+        "palavras ou expressões importantes para um estudante do nível indicado. "
+        "Para cada item, forneça: a palavra/expressão, definição em inglês, definição em português, "
+        "e um exemplo de uso em uma frase. Responda em formato JSON com a chave vocabulary, "
+        "um array de itens com as chaves word, definition, translation e example. "
+        "Seja conciso, sem texto de preenchimento."
+    ),
+}
+_TRANSLATE_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é um tradutor profissional. "
+        "Traduza o texto informado para o idioma de destino indicado. "
+        "Responda apenas com o texto traduzido, sem comentários."
+    ),
+}
+
+# Saídas estruturadas estritas: a resposta sempre segue o esquema, sem texto extra
+_LESSON_FORMAT = response_format(LessonContent)
+_EXERCISES_FORMAT = response_format(ExerciseList)
+_EVALUATION_FORMAT = response_format(Evaluation)
+_PRONUNCIATION_FORMAT = response_format(PronunciationEvaluation)
+_VOCABULARY_FORMAT = response_format(VocabularyList)
 
 
 class OpenAIService(AIService):
@@ -15,59 +114,125 @@ class OpenAIService(AIService):
         if not self.api_key:
             raise ValueError("API Key da OpenAI não fornecida")
 
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # Cliente assíncrono com pool de conexões keep-alive compartilhado
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            # As novas tentativas são controladas por _chat, junto com o semáforo
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+            ),
+        )
+
+        # Limita as requisições simultâneas para não estourar os limites de RPM/TPM
+        self._semaphore = asyncio.Semaphore(50)
+        self.max_retries = 5
+        self.max_retry_delay = 30.0
+
+        # Modelo por funcionalidade: tarefas simples usam o modelo menor e mais barato
+        self.models = {
+            "chat": "gpt-4o",
+            "lesson": "gpt-4o",
+            "exercises": "gpt-4o",
+            "evaluate": "gpt-4o",
+            "pronunciation": "gpt-4o-mini",
+            "vocab": "gpt-4o-mini",
+            "translate": "gpt-4o-mini",
+        }
+
+        # Cache de respostas idênticas para tradução, vocabulário e avaliações
+        self._response_cache = TTLCache(maxsize=2048, ttl=86400)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Normaliza apenas os espaços; maiúsculas e pontuação contam na avaliação"""
+        return " ".join(text.split())
+
+    @staticmethod
+    def _cache_key(*parts: Any) -> bytes:
+        """Gera a chave do cache a partir dos argumentos da chamada"""
+        return hashlib.blake2b(orjson.dumps(parts), digest_size=16).digest()
+
+    def _retry_delay(self, error: openai.APIError, attempt: int) -> float:
+        """Calcula a espera antes da próxima tentativa, respeitando o Retry-After"""
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_delay)
+            except ValueError:
+                pass
+        return min(2**attempt + random.uniform(0, 1), self.max_retry_delay)
+
+    async def _chat(self, **kwargs: Any) -> Any:
+        """
+        Cria um chat completion respeitando o limite de concorrência e tentando
+        novamente, com espera exponencial, em caso de limite de taxa ou timeout.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await self.client.chat.completions.create(**kwargs)
+            except (openai.RateLimitError, openai.APITimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+
+            # A espera acontece fora do semáforo para não bloquear outras requisições
+            logger.warning("Limite da OpenAI atingido, nova tentativa em %.1fs", delay)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _output_budget(cap: int, *texts: str) -> int:
+        """Limita os tokens de saída proporcionalmente ao tamanho da entrada"""
+        # Cerca de 4 caracteres por token, com folga de 20% e um mínimo fixo
+        input_chars = sum(len(text) for text in texts)
+        return min(cap, int(input_chars / 4 * 1.2) + 256)
 
-        # Modelo padrão - pode ser substituído por modelos mais recentes
-        self.model = "gpt-4"
+    async def aclose(self) -> None:
+        """Fecha o cliente HTTP da OpenAI"""
+        await self.client.close()
 
     async def generate_response(
         self, messages: List[Dict[str, str]], user_level: str, max_tokens: int = 500
     ) -> str:
         """Gera uma resposta com base no histórico de mensagens e nível do usuário"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["chat"],
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=0.7,
             )
             return response.choices[0].message.content
-        except Exception as e:
-            print(f"Erro ao gerar resposta: {e}")
-            return "Desculpe, não consegui gerar uma resposta. Por favor, tente novamente mais tarde."
+        except Exception:
+            logger.exception("Erro ao gerar resposta")
+            return self.FALLBACK_RESPONSE
 
     async def generate_lesson_content(
         self, topic: str, difficulty: str, category: str
     ) -> Dict[str, Any]:
         """Gera conteúdo para uma lição com base no tópico, dificuldade e categoria"""
-        prompt = (
-            f"Crie uma lição de inglês completa sobre '{topic}'. "
-            f"Nível: {difficulty}. Categoria: {category}. "
-            "A lição deve incluir: introdução, conteúdo principal, exemplos, "
-            "prática e conclusão. Forneça também um título adequado e "
-            "uma breve descrição. Responda em formato JSON com as seguintes chaves: "
-            "title, description, introduction, main_content, examples, practice, conclusion."
-        )
+        prompt = f"Tópico: '{topic}'. Nível: {difficulty}. Categoria: {category}."
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["lesson"],
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em criar materiais didáticos para ensino de inglês.",
-                    },
+                    _LESSON_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=1500,
+                max_tokens=1050,
                 temperature=0.7,
-                response_format={"type": "json_object"},
+                response_format=_LESSON_FORMAT,
             )
 
             content = response.choices[0].message.content
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao gerar conteúdo da lição: {e}")
+            return orjson.loads(content)
+        except Exception:
+            logger.exception("Erro ao gerar conteúdo da lição")
             return {
                 "title": f"Lição sobre {topic}",
                 "description": "Conteúdo não disponível no momento.",
@@ -83,40 +248,26 @@ class OpenAIService(AIService):
     ) -> List[Dict[str, Any]]:
         """Gera exercícios baseados no conteúdo da lição"""
         prompt = (
-            f"Com base no seguinte conteúdo de lição de inglês:\n\n{lesson_content}\n\n"
-            f"Crie {num_exercises} exercícios de nível {difficulty}. "
-            "Inclua uma mistura de perguntas de múltipla escolha e perguntas abertas. "
-            "Para cada exercício, forneça: pergunta, opções (quando aplicável), "
-            "resposta correta e explicação. Responda em formato JSON como um array de exercícios."
+            f"Número de exercícios: {num_exercises}. Nível: {difficulty}.\n\n"
+            f"Conteúdo da lição:\n\n{lesson_content}"
         )
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["exercises"],
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em criar exercícios para ensino de inglês.",
-                    },
+                    _EXERCISES_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=1500,
+                max_tokens=200 * num_exercises,
                 temperature=0.7,
-                response_format={"type": "json_object"},
+                response_format=_EXERCISES_FORMAT,
             )
 
             content = response.choices[0].message.content
-            exercises_data = json.loads(content)
-
-            # Garantir que o retorno seja uma lista
-            if isinstance(exercises_data, dict) and "exercises" in exercises_data:
-                return exercises_data["exercises"]
-            elif isinstance(exercises_data, list):
-                return exercises_data
-            else:
-                return []
-        except Exception as e:
-            print(f"Erro ao gerar exercícios: {e}")
+            return orjson.loads(content)["exercises"]
+        except Exception:
+            logger.exception("Erro ao gerar exercícios")
             return []
 
     async def evaluate_response(
@@ -124,34 +275,43 @@ class OpenAIService(AIService):
     ) -> Dict[str, Any]:
         """Avalia a resposta do usuário em relação a um padrão esperado"""
         prompt = (
-            f"Avalie a resposta de um estudante de inglês de nível {user_level}.\n\n"
+            f"Nível do estudante: {user_level}.\n\n"
             f"Contexto ou pergunta: {expected_pattern}\n\n"
-            f"Resposta do estudante: {user_response}\n\n"
-            "Forneça uma avaliação detalhada incluindo: correções gramaticais, "
-            "avaliação de vocabulário, sugestões de melhoria, e uma pontuação de 0 a 1 "
-            "para gramática e adequação da resposta. Responda em formato JSON com as seguintes chaves: "
-            "feedback, grammar_corrections, vocabulary_suggestions, grammar_score, adequacy_score."
+            f"Resposta do estudante: {user_response}"
+        )
+
+        # Notas só são reaproveitadas para a mesma resposta exata: respostas parecidas
+        # podem ter correção bem diferente
+        key = self._cache_key(
+            "eval",
+            user_level,
+            self._normalize(expected_pattern),
+            self._normalize(user_response),
         )
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["evaluate"],
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um professor de inglês avaliando respostas de alunos.",
-                    },
+                    _EVALUATION_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=1000,
+                # Orçamento fixo: o objeto do esquema não encolhe com respostas curtas,
+                # e um JSON cortado viraria a avaliação padrão gravada no progresso
+                max_tokens=700,
                 temperature=0.3,
-                response_format={"type": "json_object"},
+                response_format=_EVALUATION_FORMAT,
             )
 
             content = response.choices[0].message.content
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao avaliar resposta: {e}")
+            evaluation = orjson.loads(content)
+            self._response_cache.set(key, copy.deepcopy(evaluation))
+            return evaluation
+        except Exception:
+            logger.exception("Erro ao avaliar resposta")
             return {
                 "feedback": "Não foi possível avaliar a resposta.",
                 "grammar_corrections": [],
@@ -165,34 +325,37 @@ class OpenAIService(AIService):
     ) -> Dict[str, Any]:
         """Avalia a pronúncia do usuário comparando o texto esperado com a transcrição do áudio"""
         prompt = (
-            f"Avalie a pronúncia de um estudante de inglês.\n\n"
             f"Texto esperado: {expected_text}\n\n"
-            f"Texto transcrito do áudio: {audio_transcription}\n\n"
-            "Compare os dois textos e identifique erros de pronúncia, palavras omitidas ou adicionadas. "
-            "Forneça feedback detalhado, sugestões de melhoria, e uma pontuação de 0 a 1. "
-            "Responda em formato JSON com as seguintes chaves: pronunciation_feedback, "
-            "identified_errors, improvement_suggestions, pronunciation_score."
+            f"Texto transcrito do áudio: {audio_transcription}"
         )
 
+        key = self._cache_key(
+            "pron",
+            self._normalize(expected_text),
+            self._normalize(audio_transcription),
+        )
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["pronunciation"],
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em pronúncia de inglês.",
-                    },
+                    _PRONUNCIATION_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=800,
+                max_tokens=560,
                 temperature=0.3,
-                response_format={"type": "json_object"},
+                response_format=_PRONUNCIATION_FORMAT,
             )
 
             content = response.choices[0].message.content
-            return json.loads(content)
-        except Exception as e:
-            print(f"Erro ao avaliar pronúncia: {e}")
+            evaluation = orjson.loads(content)
+            self._response_cache.set(key, copy.deepcopy(evaluation))
+            return evaluation
+        except Exception:
+            logger.exception("Erro ao avaliar pronúncia")
             return {
                 "pronunciation_feedback": "Não foi possível avaliar a pronúncia.",
                 "identified_errors": [],
@@ -205,57 +368,132 @@ class OpenAIService(AIService):
     ) -> List[Dict[str, str]]:
         """Gera uma lista de vocabulário a partir de um texto, adequada ao nível do usuário"""
         prompt = (
-            f"A partir do seguinte texto em inglês:\n\n{text}\n\n"
-            f"Extraia até {max_items} palavras ou expressões importantes para um estudante de nível {user_level}. "
-            "Para cada item, forneça: a palavra/expressão, definição em inglês, definição em português, "
-            "e um exemplo de uso em uma frase. Responda em formato JSON como um array de itens."
+            f"Nível do estudante: {user_level}. Máximo de itens: {max_items}.\n\n"
+            f"Texto:\n\n{text}"
         )
 
+        key = self._cache_key("vocab", text, user_level, max_items)
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["vocab"],
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em ensino de vocabulário de inglês.",
-                    },
+                    _VOCABULARY_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
+                # Orçamento fixo com folga: um JSON estrito cortado vira uma lista vazia
                 max_tokens=1000,
                 temperature=0.5,
-                response_format={"type": "json_object"},
+                response_format=_VOCABULARY_FORMAT,
             )
 
             content = response.choices[0].message.content
-            vocabulary_data = json.loads(content)
-
-            # Garantir que o retorno seja uma lista
-            if isinstance(vocabulary_data, dict) and "vocabulary" in vocabulary_data:
-                return vocabulary_data["vocabulary"]
-            elif isinstance(vocabulary_data, list):
-                return vocabulary_data
-            else:
-                return []
-        except Exception as e:
-            print(f"Erro ao gerar lista de vocabulário: {e}")
+            vocabulary = orjson.loads(content)["vocabulary"]
+            # Cópias profundas: quem chama pode alterar os itens sem afetar o cache
+            self._response_cache.set(key, copy.deepcopy(vocabulary))
+            return vocabulary
+        except Exception:
+            logger.exception("Erro ao gerar lista de vocabulário")
             return []
 
     async def translate_text(self, text: str, target_language: str = "pt-br") -> str:
         """Traduz um texto para o idioma de destino"""
-        prompt = f"Traduza o seguinte texto para {target_language}:\n\n{text}"
+        prompt = f"Idioma de destino: {target_language}.\n\nTexto:\n\n{text}"
+
+        key = self._cache_key("tr", target_language, text)
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            return cached
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = await self._chat(
+                model=self.models["translate"],
                 messages=[
-                    {"role": "system", "content": "Você é um tradutor profissional."},
+                    _TRANSLATE_SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=1000,
+                max_tokens=self._output_budget(1000, text),
                 temperature=0.3,
             )
 
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Erro ao traduzir texto: {e}")
+            translation = response.choices[0].message.content
+            if translation:
+                self._response_cache.set(key, translation)
+            return translation
+        except Exception:
+            logger.exception("Erro ao traduzir texto")
             return f"Erro na tradução: {text}"
+
+    async def generate_responses_batch(
+        self,
+        jobs: List[Dict[str, Any]],
+        model_key: str = "chat",
+        poll_interval: float = 30.0,
+    ) -> List[Optional[str]]:
+        """
+        Gera respostas para tarefas não interativas usando a Batch API da OpenAI,
+        mais barata e fora dos limites de requisições por minuto.
+
+        Args:
+            jobs: Lista de dicionários com `messages` e, opcionalmente, `max_tokens`
+            model_key: Chave em `self.models` do modelo usado nas tarefas
+            poll_interval: Intervalo, em segundos, entre as consultas ao status do lote
+
+        Returns:
+            As respostas na mesma ordem das tarefas, com None nas que falharam
+        """
+        lines = [
+            orjson.dumps(
+                {
+                    "custom_id": str(index),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.models[model_key],
+                        "messages": job["messages"],
+                        "max_tokens": job.get("max_tokens", 500),
+                        "temperature": 0.7,
+                    },
+                }
+            )
+            for index, job in enumerate(jobs)
+        ]
+
+        results: List[Optional[str]] = [None] * len(jobs)
+        try:
+            batch_file = await self.client.files.create(
+                file=("batch.jsonl", b"\n".join(lines)),
+                purpose="batch",
+            )
+            batch = await self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(poll_interval)
+                batch = await self.client.batches.retrieve(batch.id)
+
+            if not batch.output_file_id:
+                logger.warning(
+                    "Lote %s finalizado sem resultados: %s", batch.id, batch.status
+                )
+                return results
+
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                item = orjson.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    body = response["body"]
+                    results[int(item["custom_id"])] = body["choices"][0]["message"][
+                        "content"
+                    ]
+        except Exception:
+            logger.exception("Erro ao processar lote de respostas")
+
+        return results
@@ -1,15 +1,38 @@
 import asyncio
+import logging
 import os
 import tempfile
 import uuid
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
 
 import aiohttp
-import speech_recognition as sr
-from pydub import AudioSegment
+import openai
 
 from src.domain.interfaces.speech_service import SpeechService
 
+logger = logging.getLogger(__name__)
+
+
+def _token_edit_distance(expected: List[str], spoken: List[str]) -> int:
+    """Distância de Levenshtein entre duas listas de palavras, mantendo só duas linhas"""
+    if len(spoken) > len(expected):
+        expected, spoken = spoken, expected
+
+    previous = list(range(len(spoken) + 1))
+    for i, expected_word in enumerate(expected, 1):
+        current = [i]
+        for j, spoken_word in enumerate(spoken, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (expected_word != spoken_word),
+                )
+            )
+        previous = current
+    return previous[-1]
+
 
 class SpeechServiceImpl(SpeechService):
     """Implementação do serviço de processamento de fala"""
@@ -19,9 +42,36 @@ class SpeechServiceImpl(SpeechService):
         if not self.openai_api_key:
             raise ValueError("API Key da OpenAI não fornecida")
 
-        self.recognizer = sr.Recognizer()
+        # Transcrição direta pela API da OpenAI, enviando o arquivo original
+        self.openai_client = openai.AsyncOpenAI(api_key=self.openai_api_key)
+        self.transcription_model = "whisper-1"
         self.temp_dir = tempfile.gettempdir()
 
+        # Sessão HTTP compartilhada para os downloads, criada sob demanda
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Retorna a sessão HTTP compartilhada, reaproveitando conexões com a CDN do Discord"""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    # DNS em cache por 5 minutos e conexões ociosas mantidas por 75s,
+                    # para que downloads seguidos não paguem novo handshake
+                    self._session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=50, ttl_dns_cache=300, keepalive_timeout=75
+                        )
+                    )
+        return self._session
+
+    async def aclose(self) -> None:
+        """Fecha a sessão HTTP compartilhada e o cliente da OpenAI"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        await self.openai_client.close()
+
     async def transcribe_audio(self, audio_file_path: str) -> Dict[str, Any]:
         """Transcreve um arquivo de áudio para texto"""
         try:
@@ -29,37 +79,18 @@ class SpeechServiceImpl(SpeechService):
             if not os.path.exists(audio_file_path):
                 return {"error": "Arquivo de áudio não encontrado", "text": ""}
 
-            # Converte o áudio para o formato adequado (WAV) se necessário
-            audio_file_wav = self._convert_to_wav(audio_file_path)
-
-            # Realiza a transcrição usando o SpeechRecognition com a API da OpenAI
-            with sr.AudioFile(audio_file_wav) as source:
-                audio_data = self.recognizer.record(source)
+            # O Whisper aceita OGG/Opus, MP3, WAV etc., então não há conversão local
+            with open(audio_file_path, "rb") as audio_file:
+                result = await self.openai_client.audio.transcriptions.create(
+                    model=self.transcription_model,
+                    file=audio_file,
+                    response_format="json",
+                )
 
-                # Tenta usar a API Whisper da OpenAI para transcrição de alta precisão
-                try:
-                    text = self.recognizer.recognize_whisper(
-                        audio_data, api_key=self.openai_api_key
-                    )
-                    return {"text": text, "success": True}
-                except sr.RequestError:
-                    # Fallback para reconhecimento offline da Google se a API da OpenAI falhar
-                    try:
-                        text = self.recognizer.recognize_google(audio_data)
-                        return {
-                            "text": text,
-                            "success": True,
-                            "note": "Usando reconhecimento de fallback",
-                        }
-                    except:
-                        return {
-                            "error": "Falha na transcrição",
-                            "text": "",
-                            "success": False,
-                        }
+            return {"text": result.text, "success": True}
 
         except Exception as e:
-            print(f"Erro ao transcrever áudio: {e}")
+            logger.exception("Erro ao transcrever áudio")
             return {"error": str(e), "text": "", "success": False}
 
     async def analyze_pronunciation(
@@ -75,8 +106,14 @@ class SpeechServiceImpl(SpeechService):
                 "feedback": "Não foi possível analisar a pronúncia devido a um erro na transcrição.",
             }
 
-        transcribed_text = transcription_result.get("text", "")
+        return self.score_pronunciation(
+            transcription_result.get("text", ""), expected_text
+        )
 
+    def score_pronunciation(
+        self, transcribed_text: str, expected_text: str
+    ) -> Dict[str, Any]:
+        """Avalia a pronúncia a partir de uma transcrição já obtida"""
         # Implementação simples de avaliação de pronúncia baseada em comparação de texto
         # Em um sistema real, usaríamos um serviço mais sofisticado para análise fonética
 
@@ -88,15 +125,11 @@ class SpeechServiceImpl(SpeechService):
         expected_words = expected_lower.split()
         transcribed_words = transcribed_lower.split()
 
-        # Conta palavras corretas
-        correct_words = 0
-        for word in transcribed_words:
-            if word in expected_words:
-                correct_words += 1
-
-        # Calcula o score
-        max_words = max(len(expected_words), len(transcribed_words))
-        score = correct_words / max_words if max_words > 0 else 0
+        # Calcula o score pela distância de edição entre as sequências de palavras,
+        # penalizando palavras trocadas, omitidas, adicionadas ou fora de ordem
+        max_words = max(len(expected_words), len(transcribed_words), 1)
+        distance = _token_edit_distance(expected_words, transcribed_words)
+        score = 1 - distance / max_words
 
         # Gera feedback
         if score > 0.9:
@@ -132,8 +165,8 @@ class SpeechServiceImpl(SpeechService):
             # Aqui usaríamos um serviço específico para detecção de idioma
             # Por simplicidade, assumimos inglês se a transcrição for bem-sucedida
             return "en"
-        except Exception as e:
-            print(f"Erro ao detectar idioma: {e}")
+        except Exception:
+            logger.exception("Erro ao detectar idioma")
             return "unknown"
 
     async def text_to_speech(
@@ -149,7 +182,9 @@ class SpeechServiceImpl(SpeechService):
         # Aqui usaríamos uma API real de text-to-speech
         # Por simplificação, apenas retornamos o caminho que seria criado
 
-        print(f"[TTS] Texto '{text}' seria convertido para áudio em '{output_path}'")
+        logger.info(
+            "[TTS] Texto '%s' seria convertido para áudio em '%s'", text, output_path
+        )
 
         # Simula um atraso de processamento
         await asyncio.sleep(0.5)
@@ -162,7 +197,7 @@ class SpeechServiceImpl(SpeechService):
         """Processa uma gravação de voz enviada por um usuário do Discord"""
         try:
             # Baixar o arquivo de áudio do Discord
-            local_file_path = await self._download_attachment(
+            local_file_path = await self.download_attachment(
                 discord_attachment_url, user_id
             )
 
@@ -184,10 +219,10 @@ class SpeechServiceImpl(SpeechService):
             return transcription
 
         except Exception as e:
-            print(f"Erro ao processar gravação de voz: {e}")
+            logger.exception("Erro ao processar gravação de voz")
             return {"error": str(e), "success": False}
 
-    async def _download_attachment(self, url: str, user_id: str) -> Optional[str]:
+    async def download_attachment(self, url: str, user_id: str) -> Optional[str]:
         """Faz o download de um anexo de áudio do Discord"""
         try:
             # Criar diretório temporário para o usuário se não existir
@@ -195,46 +230,26 @@ class SpeechServiceImpl(SpeechService):
             os.makedirs(user_temp_dir, exist_ok=True)
 
             # Caminho para salvar o arquivo
-            file_ext = url.split(".")[-1] if "." in url else "ogg"
+            # A extensão vem só do caminho: as URLs da CDN do Discord têm query string,
+            # e o Whisper identifica o formato pelo nome do arquivo
+            file_ext = os.path.splitext(urlsplit(url).path)[1].lstrip(".") or "ogg"
             local_file_path = os.path.join(
                 user_temp_dir, f"audio_{uuid.uuid4()}.{file_ext}"
             )
 
             # Fazer o download usando aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        with open(local_file_path, "wb") as f:
-                            f.write(await response.read())
-                        return local_file_path
-                    else:
-                        print(f"Erro ao baixar anexo: {response.status}")
-                        return None
-
-        except Exception as e:
-            print(f"Erro no download do anexo: {e}")
+            session = await self._get_session()
+            async with session.get(url) as response:
+                if response.status == 200:
+                    # Grava em blocos para não manter o arquivo inteiro em memória
+                    with open(local_file_path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            f.write(chunk)
+                    return local_file_path
+                else:
+                    logger.warning("Erro ao baixar anexo: %s", response.status)
+                    return None
+
+        except Exception:
+            logger.exception("Erro no download do anexo")
             return None
-
-    def _convert_to_wav(self, audio_file_path: str) -> str:
-        """Converte um arquivo de áudio para o formato WAV"""
-        try:
-            # Verifica a extensão do arquivo
-            file_ext = os.path.splitext(audio_file_path)[1].lower()
-
-            # Se já for WAV, retorna o caminho original
-            if file_ext == ".wav":
-                return audio_file_path
-
-            # Caso contrário, converte para WAV
-            output_path = os.path.splitext(audio_file_path)[0] + ".wav"
-
-            # Usa pydub para conversão
-            audio = AudioSegment.from_file(audio_file_path)
-            audio.export(output_path, format="wav")
-
-            return output_path
-
-        except Exception as e:
-            print(f"Erro ao converter áudio para WAV: {e}")
-            # Se falhar, retorna o caminho original
-            return audio_file_path
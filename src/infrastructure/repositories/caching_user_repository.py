@@ -0,0 +1,133 @@
+import copy
+from typing import AsyncIterator, Dict, List, Optional
+
+from src.application.services.ttl_cache import TTLCache
+from src.domain.entities.user import User
+from src.domain.interfaces.user_repository import UserRepository
+
+
+class CachingUserRepository(UserRepository):
+    """
+    Decorador do repositório de usuários que mantém em memória os usuários
+    acessados recentemente, indexados pelo ID e pelo ID do Discord.
+    O cache guarda cópias do estado persistido: alterações feitas pelos chamadores
+    só chegam a ele depois de gravadas.
+    """
+
+    def __init__(
+        self, repository: UserRepository, maxsize: int = 1000, ttl: float = 60.0
+    ):
+        """
+        Inicializa o decorador com o repositório a ser envolvido.
+
+        Args:
+            repository: Repositório consultado em caso de falta no cache
+            maxsize: Número máximo de entradas no cache
+            ttl: Tempo de vida de cada entrada, em segundos
+        """
+        self.repository = repository
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def initialize(self) -> None:
+        await self.repository.initialize()
+
+    async def aclose(self) -> None:
+        await self.repository.aclose()
+
+    def _remember(self, user: User) -> None:
+        """Armazena uma cópia do usuário no cache pelas duas chaves de busca"""
+        snapshot = copy.deepcopy(user)
+        self.cache.set(("id", user.id), snapshot)
+        self.cache.set(("discord_id", user.discord_id), snapshot)
+
+    def _cached(self, key) -> Optional[User]:
+        """Retorna uma cópia do usuário em cache, que o chamador pode alterar"""
+        user = self.cache.get(key)
+        return copy.deepcopy(user) if user is not None else None
+
+    def _forget(self, user: User) -> None:
+        """Remove o usuário do cache pelas duas chaves de busca"""
+        self.cache.pop(("id", user.id))
+        self.cache.pop(("discord_id", user.discord_id))
+
+    async def get_by_id(self, user_id: str) -> Optional[User]:
+        """Recupera um usuário pelo ID, consultando o cache primeiro"""
+        # Dentro de uma unidade de trabalho, a instância pendente tem o estado atual
+        user = self._get_pending(user_id=user_id) or self._cached(("id", user_id))
+        if user is None:
+            user = await self.repository.get_by_id(user_id)
+            if user:
+                self._remember(user)
+        return user
+
+    async def get_by_discord_id(self, discord_id: str) -> Optional[User]:
+        """Recupera um usuário pelo ID do Discord, consultando o cache primeiro"""
+        user = self._get_pending(discord_id=discord_id) or self._cached(
+            ("discord_id", discord_id)
+        )
+        if user is None:
+            user = await self.repository.get_by_discord_id(discord_id)
+            if user:
+                self._remember(user)
+        return user
+
+    async def save(self, user: User) -> User:
+        """Salva o usuário e atualiza o cache com o estado persistido"""
+        try:
+            saved_user = await self.repository.save(user)
+        except Exception:
+            # O objeto em cache pode ter sido alterado, então não deve ser reaproveitado
+            self._forget(user)
+            raise
+
+        # Gravações adiadas só entram no cache quando a unidade de trabalho grava;
+        # se ela for abortada, o cache continua com o último estado persistido
+        if not self._in_unit_of_work():
+            self._remember(saved_user)
+        return saved_user
+
+    async def save_many(self, users: List[User], concurrency: int = 16) -> List[User]:
+        """Salva os usuários em lote e atualiza o cache com o estado persistido"""
+        try:
+            saved_users = await self.repository.save_many(users, concurrency)
+        except Exception:
+            for user in users:
+                self._forget(user)
+            raise
+
+        if not self._in_unit_of_work():
+            for user in saved_users:
+                self._remember(user)
+        return saved_users
+
+    async def get_or_create(self, user: User) -> User:
+        """Retorna o usuário em cache ou delega a busca/criação ao repositório"""
+        cached_user = self._get_pending(discord_id=user.discord_id) or self._cached(
+            ("discord_id", user.discord_id)
+        )
+        if cached_user is not None:
+            return cached_user
+
+        stored_user = await self.repository.get_or_create(user)
+        self._remember(stored_user)
+        return stored_user
+
+    async def delete(self, user_id: str) -> bool:
+        """Remove o usuário do repositório e do cache"""
+        cached_user = self.cache.pop(("id", user_id))
+        if cached_user:
+            self.cache.pop(("discord_id", cached_user.discord_id))
+        return await self.repository.delete(user_id)
+
+    async def list_all(self) -> List[User]:
+        return await self.repository.list_all()
+
+    async def iter_all(self) -> AsyncIterator[User]:
+        async for user in self.repository.iter_all():
+            yield user
+
+    async def list_by_proficiency(self, proficiency_level: str) -> List[User]:
+        return await self.repository.list_by_proficiency(proficiency_level)
+
+    async def get_user_statistics(self) -> Dict:
+        return await self.repository.get_user_statistics()
@@ -1,261 +1,342 @@
-import json
+import logging
 import os
-import asyncio
-from datetime import datetime
-from typing import Dict, List, Optional
-
-from sqlalchemy import JSON, Column, DateTime, Float, Integer, String, create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+import orjson
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    bindparam,
+    case,
+    delete,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.domain.entities.user import ProficiencyLevel, User, UserProgress
 from src.domain.interfaces.user_repository import UserRepository
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
+# JSONB no PostgreSQL; nos demais bancos, o JSON genérico do SQLAlchemy
+_JSONList = JSON().with_variant(JSONB(), "postgresql")
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Lê uma variável de ambiente booleana"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def to_async_database_url(database_url: str) -> str:
+    """Garante que estamos usando os drivers assíncronos (asyncpg e aiosqlite)"""
+    if database_url.startswith("postgresql:") and "+asyncpg" not in database_url:
+        return database_url.replace("postgresql:", "postgresql+asyncpg:")
+    if database_url.startswith("postgres:") and "+asyncpg" not in database_url:
+        return database_url.replace("postgres:", "postgresql+asyncpg:")
+    if database_url.startswith("sqlite:"):
+        return database_url.replace("sqlite:", "sqlite+aiosqlite:")
+    return database_url
+
+
+def create_pooled_async_engine(
+    database_url: str, pool_pre_ping: Optional[bool] = None
+) -> AsyncEngine:
+    """
+    Cria um engine assíncrono do PostgreSQL com o pool configurado por variáveis de ambiente.
+
+    Args:
+        database_url: URL do banco de dados
+        pool_pre_ping: Verifica a conexão antes de usá-la; se None, usa DATABASE_POOL_PRE_PING
+    """
+    if pool_pre_ping is None:
+        pool_pre_ping = _env_flag("DATABASE_POOL_PRE_PING", True)
+
+    return create_async_engine(
+        to_async_database_url(database_url),
+        # O log de SQL é síncrono e caro, então só é ativado em modo de depuração
+        echo=_env_flag("DEBUG"),
+        # Explícito para que o engine assíncrono nunca acabe com o QueuePool síncrono
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=int(os.getenv("DATABASE_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DATABASE_MAX_OVERFLOW", "10")),
+        pool_recycle=int(os.getenv("DATABASE_POOL_RECYCLE", "1800")),
+        pool_pre_ping=pool_pre_ping,
+        # Keepalives TCP evitam que conexões ociosas sejam derrubadas silenciosamente
+        connect_args={
+            "server_settings": {
+                "tcp_keepalives_idle": "60",
+                "tcp_keepalives_interval": "30",
+                "tcp_keepalives_count": "3",
+            }
+        },
+    )
+
 
 class UserModel(Base):
     """Modelo SQLAlchemy para a tabela de usuários"""
 
     __tablename__ = "users"
+    # Atende aos filtros por nível (list_by_proficiency) e por última interação
+    __table_args__ = (
+        Index("ix_users_prof_last", "proficiency_level", "last_interaction"),
+    )
 
     id = Column(String, primary_key=True)
     discord_id = Column(String, unique=True, index=True)
     username = Column(String)
-    proficiency_level = Column(String)
+    proficiency_level = Column(String(16))
     vocabulary_mastered = Column(Integer, default=0)
     lessons_completed = Column(Integer, default=0)
     practice_sessions = Column(Integer, default=0)
     pronunciation_score = Column(Float, default=0.0)
     grammar_accuracy = Column(Float, default=0.0)
-    last_active = Column(DateTime, default=datetime.now)
-    completed_topics = Column(JSON, default=lambda: json.dumps([]))
-    conversation_history = Column(JSON, default=lambda: json.dumps([]))
-    created_at = Column(DateTime, default=datetime.now)
+    # Preenchidas pelo banco quando omitidas, sem custo no lado do Python: o
+    # default=now() entra no próprio INSERT, valendo também para tabelas criadas
+    # antes do server_default, que o create_all não altera
+    last_active = Column(DateTime, default=func.now(), server_default=func.now())
+    completed_topics = Column(_JSONList, default=list)
+    conversation_history = Column(_JSONList, default=list)
+    created_at = Column(DateTime, default=func.now(), server_default=func.now())
     last_interaction = Column(DateTime, nullable=True)
 
 
+# Colunas definidas na criação do usuário e nunca reescritas pelo UPSERT
+_IMMUTABLE_COLUMNS = frozenset(("id", "created_at"))
+
+# Consultas frequentes montadas uma única vez, com parâmetros vinculados na execução
+_GET_BY_ID_STMT = select(UserModel).where(UserModel.id == bindparam("user_id"))
+_GET_BY_DISCORD_ID_STMT = select(UserModel).where(
+    UserModel.discord_id == bindparam("discord_id")
+)
+_LIST_BY_PROFICIENCY_STMT = select(UserModel).where(
+    UserModel.proficiency_level == bindparam("proficiency_level")
+)
+
+
 class SQLAlchemyUserRepository(UserRepository):
     """Implementação do repositório de usuários usando SQLAlchemy"""
 
+    # Linhas buscadas por vez ao percorrer a tabela inteira
+    STREAM_BATCH_SIZE = 500
+
     def __init__(self, database_url: str):
         """Inicializa o repositório com a URL do banco de dados"""
         self.database_url = database_url
 
+        # Sem expiração após commit nem autoflush: as entidades são mapeadas
+        # dentro da sessão e não precisam ser recarregadas
         if database_url.startswith("sqlite"):
-            # Para SQLite, usamos um engine síncrono com emulação assíncrona
-            # já que SQLite não suporta operações assíncronas nativas
-            self.engine = create_engine(database_url)
-            self.async_session = None
-            self.Session = sessionmaker(bind=self.engine)
-
-            # Cria as tabelas se não existirem
-            Base.metadata.create_all(self.engine)
+            # O SQLite usa o driver aiosqlite, que executa as consultas em uma thread
+            # própria sem bloquear o loop de eventos
+            self.engine = create_async_engine(to_async_database_url(database_url))
+            self._insert = sqlite_insert
         else:
-            # Garantir que estamos usando o driver asyncpg
-            db_url = database_url
-            if db_url.startswith("postgresql:") and "+asyncpg" not in db_url:
-                db_url = db_url.replace("postgresql:", "postgresql+asyncpg:")
-            elif db_url.startswith("postgres:") and "+asyncpg" not in db_url:
-                db_url = db_url.replace("postgres:", "postgresql+asyncpg:")
-
-            # Para PostgreSQL com SSL, verificamos o certificado
-            connect_args = {}
-            # Para PostgreSQL, usamos engine assíncrono
-            self.engine = create_async_engine(
-                db_url, echo=False, future=True, connect_args=connect_args
-            )
-            self.async_session = async_sessionmaker(self.engine, expire_on_commit=False)
-            self.Session = None
-
-            # Criar tabelas assincronamente se possível
-            try:
-
-                async def create_tables():
-                    async with self.engine.begin() as conn:
-                        await conn.run_sync(Base.metadata.create_all)
-
-                try:
-                    # Tentar executar no loop atual se existir
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        print(
-                            "Loop em execução, as tabelas serão criadas posteriormente"
-                        )
-                    else:
-                        loop.run_until_complete(create_tables())
-                except RuntimeError:
-                    # Criar um novo loop se necessário
-                    asyncio.run(create_tables())
-            except Exception as e:
-                print(f"Aviso ao criar tabelas: {e}")
-                print("Você pode precisar criar as tabelas manualmente.")
+            # Para PostgreSQL, usamos engine assíncrono com pool configurável
+            self.engine = create_pooled_async_engine(database_url)
+            self._insert = pg_insert
+
+        # Os valores são vinculados na execução, permitindo gravar um ou vários usuários
+        self._upsert_stmt = self._upsert_statement()
+
+        self.async_session = async_sessionmaker(
+            self.engine, expire_on_commit=False, autoflush=False
+        )
+        # Consultas pontuais de leitura usam AUTOCOMMIT, sem o BEGIN/ROLLBACK que a
+        # sessão abriria implicitamente; o pool de conexões é o mesmo
+        self.read_session = async_sessionmaker(
+            self.engine.execution_options(isolation_level="AUTOCOMMIT"),
+            expire_on_commit=False,
+            autoflush=False,
+        )
+
+    async def initialize(self) -> None:
+        """Cria as tabelas que ainda não existem"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def aclose(self) -> None:
+        """Fecha as conexões do pool"""
+        await self.engine.dispose()
 
     async def get_by_id(self, user_id: str) -> Optional[User]:
         """Recupera um usuário pelo ID"""
-        if self.async_session:
-            async with self.async_session() as session:
-                async with session.begin():
-                    result = await session.execute(
-                        select(UserModel).where(UserModel.id == user_id)
-                    )
-                    user_model = result.scalars().first()
-                    return self._map_to_entity(user_model) if user_model else None
-        else:
-            with self.Session() as session:
-                user_model = (
-                    session.query(UserModel).filter(UserModel.id == user_id).first()
-                )
-                return self._map_to_entity(user_model) if user_model else None
+        pending_user = self._get_pending(user_id=user_id)
+        if pending_user:
+            return pending_user
+
+        async with self.read_session() as session:
+            result = await session.execute(_GET_BY_ID_STMT, {"user_id": user_id})
+            user_model = result.scalars().first()
+            return self._map_to_entity(user_model) if user_model else None
 
     async def get_by_discord_id(self, discord_id: str) -> Optional[User]:
         """Recupera um usuário pelo ID do Discord"""
-        if self.async_session:
-            async with self.async_session() as session:
-                async with session.begin():
-                    result = await session.execute(
-                        select(UserModel).where(UserModel.discord_id == discord_id)
-                    )
-                    user_model = result.scalars().first()
-                    return self._map_to_entity(user_model) if user_model else None
-        else:
-            with self.Session() as session:
-                user_model = (
-                    session.query(UserModel)
-                    .filter(UserModel.discord_id == discord_id)
-                    .first()
-                )
-                return self._map_to_entity(user_model) if user_model else None
+        pending_user = self._get_pending(discord_id=discord_id)
+        if pending_user:
+            return pending_user
+
+        async with self.read_session() as session:
+            result = await session.execute(
+                _GET_BY_DISCORD_ID_STMT, {"discord_id": discord_id}
+            )
+            user_model = result.scalars().first()
+            return self._map_to_entity(user_model) if user_model else None
 
     async def save(self, user: User) -> User:
         """Salva ou atualiza um usuário no repositório"""
-        # Mapeia a entidade de domínio para o modelo do SQLAlchemy
-        user_dict = {
+        # Dentro de uma unidade de trabalho a gravação acontece ao final do bloco
+        if self._defer_save(user):
+            return user
+
+        # Um único INSERT ... ON CONFLICT DO UPDATE, sem consultar o usuário antes
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(self._upsert_stmt, self._to_row(user))
+
+        return user
+
+    async def save_many(self, users: List[User], concurrency: int = 16) -> List[User]:
+        """Salva vários usuários com um único UPSERT em lote, em uma só ida ao banco"""
+        pending = [user for user in users if not self._defer_save(user)]
+        if pending:
+            # Um executemany exige as mesmas colunas em todas as linhas, e as colunas
+            # preenchidas pelo banco só aparecem quando a entidade já tem o valor
+            batches: Dict[frozenset, List[Dict]] = {}
+            for user in pending:
+                row = self._to_row(user)
+                batches.setdefault(frozenset(row), []).append(row)
+
+            async with self.async_session() as session:
+                async with session.begin():
+                    for rows in batches.values():
+                        await session.execute(self._upsert_stmt, rows)
+        return users
+
+    async def get_or_create(self, user: User) -> User:
+        """
+        Busca ou cria o usuário em uma única ida ao banco: INSERT ... ON CONFLICT
+        pelo ID do Discord, retornando a linha existente ou a recém-criada.
+        """
+        pending_user = self._get_pending(discord_id=user.discord_id)
+        if pending_user:
+            return pending_user
+
+        stmt = self._insert(UserModel).values(self._to_row(user))
+        # O DO UPDATE sem efeito garante que o RETURNING traga a linha já existente
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserModel.discord_id],
+            set_={"discord_id": stmt.excluded.discord_id},
+        ).returning(UserModel)
+
+        async with self.async_session() as session:
+            async with session.begin():
+                user_model = (await session.scalars(stmt)).one()
+
+        return self._map_to_entity(user_model)
+
+    @staticmethod
+    def _to_row(user: User) -> Dict:
+        """Mapeia a entidade de domínio para os valores da tabela de usuários"""
+        # O progresso fica em uma variável local para não repetir a busca do atributo
+        progress = user.progress
+        row = {
             "id": user.id,
             "discord_id": user.discord_id,
             "username": user.username,
             "proficiency_level": user.proficiency_level.value,
-            "vocabulary_mastered": user.progress.vocabulary_mastered,
-            "lessons_completed": user.progress.lessons_completed,
-            "practice_sessions": user.progress.practice_sessions,
-            "pronunciation_score": user.progress.pronunciation_score,
-            "grammar_accuracy": user.progress.grammar_accuracy,
-            "last_active": user.progress.last_active,
-            "completed_topics": json.dumps(user.progress.completed_topics),
-            "conversation_history": json.dumps(user.conversation_history),
-            "created_at": user.created_at,
+            "vocabulary_mastered": progress.vocabulary_mastered,
+            "lessons_completed": progress.lessons_completed,
+            "practice_sessions": progress.practice_sessions,
+            "pronunciation_score": progress.pronunciation_score,
+            "grammar_accuracy": progress.grammar_accuracy,
+            "completed_topics": list(progress.completed_topics),
+            "conversation_history": list(user.conversation_history),
             "last_interaction": user.last_interaction,
         }
 
-        if self.async_session:
-            async with self.async_session() as session:
-                # Verifica se o usuário já existe
-                result = await session.execute(
-                    select(UserModel).where(UserModel.id == user.id)
-                )
-                existing_user = result.scalars().first()
-
-                if existing_user:
-                    # Atualiza os campos do usuário existente
-                    for key, value in user_dict.items():
-                        setattr(existing_user, key, value)
-                else:
-                    # Cria um novo usuário
-                    session.add(UserModel(**user_dict))
-
-                await session.commit()
-        else:
-            with self.Session() as session:
-                # Verifica se o usuário já existe
-                existing_user = (
-                    session.query(UserModel).filter(UserModel.id == user.id).first()
-                )
-
-                if existing_user:
-                    # Atualiza os campos do usuário existente
-                    for key, value in user_dict.items():
-                        setattr(existing_user, key, value)
-                else:
-                    # Cria um novo usuário
-                    session.add(UserModel(**user_dict))
-
-                session.commit()
-
-        return user
+        # Sem valor na entidade, as colunas ficam de fora e o server_default do banco
+        # preenche o horário, sem chamar datetime.now no Python
+        if progress.last_active is not None:
+            row["last_active"] = progress.last_active
+        if user.created_at is not None:
+            row["created_at"] = user.created_at
+        return row
+
+    def _upsert_statement(self):
+        """Monta o UPSERT de usuários com o `insert` do dialeto em uso"""
+        stmt = self._insert(UserModel)
+        return stmt.on_conflict_do_update(
+            index_elements=[UserModel.id],
+            set_={
+                column.name: stmt.excluded[column.name]
+                for column in UserModel.__table__.columns
+                if column.name not in _IMMUTABLE_COLUMNS
+            },
+        )
 
     async def delete(self, user_id: str) -> bool:
         """Remove um usuário do repositório"""
         try:
-            if self.async_session:
-                async with self.async_session() as session:
-                    result = await session.execute(
-                        select(UserModel).where(UserModel.id == user_id)
-                    )
-                    user = result.scalars().first()
-
-                    if user:
-                        await session.delete(user)
-                        await session.commit()
-                        return True
-                    return False
-            else:
-                with self.Session() as session:
-                    user = (
-                        session.query(UserModel).filter(UserModel.id == user_id).first()
-                    )
-
-                    if user:
-                        session.delete(user)
-                        session.commit()
-                        return True
-                    return False
-        except Exception as e:
-            print(f"Erro ao excluir usuário: {e}")
+            # DELETE direto, sem carregar o usuário para a sessão antes
+            stmt = delete(UserModel).where(UserModel.id == user_id)
+            async with self.async_session() as session:
+                async with session.begin():
+                    result = await session.execute(stmt)
+
+            return result.rowcount > 0
+        except Exception:
+            logger.exception("Erro ao excluir usuário")
             return False
 
     async def list_all(self) -> List[User]:
         """Lista todos os usuários"""
-        if self.async_session:
-            async with self.async_session() as session:
-                result = await session.execute(select(UserModel))
-                return [self._map_to_entity(user) for user in result.scalars().all()]
-        else:
-            with self.Session() as session:
-                return [
-                    self._map_to_entity(user) for user in session.query(UserModel).all()
-                ]
+        return [user async for user in self.iter_all()]
+
+    async def iter_all(self) -> AsyncIterator[User]:
+        """Percorre todos os usuários em lotes, sem carregar a tabela inteira de uma vez"""
+        stmt = select(UserModel).execution_options(yield_per=self.STREAM_BATCH_SIZE)
+        async with self.async_session() as session:
+            result = await session.stream(stmt)
+            async for partition in result.scalars().partitions():
+                for user in partition:
+                    yield self._map_to_entity(user)
 
     async def list_by_proficiency(self, proficiency_level: str) -> List[User]:
         """Lista usuários por nível de proficiência"""
-        if self.async_session:
-            async with self.async_session() as session:
-                result = await session.execute(
-                    select(UserModel).where(
-                        UserModel.proficiency_level == proficiency_level
-                    )
-                )
-                return [self._map_to_entity(user) for user in result.scalars().all()]
-        else:
-            with self.Session() as session:
-                return [
-                    self._map_to_entity(user)
-                    for user in session.query(UserModel)
-                    .filter(UserModel.proficiency_level == proficiency_level)
-                    .all()
-                ]
+        async with self.read_session() as session:
+            result = await session.execute(
+                _LIST_BY_PROFICIENCY_STMT, {"proficiency_level": proficiency_level}
+            )
+            return [self._map_to_entity(user) for user in result.scalars().all()]
 
     async def get_user_statistics(self) -> Dict:
         """Retorna estatísticas agregadas sobre os usuários"""
         stats = {
             "total_users": 0,
             "active_users_last_week": 0,
-            "proficiency_distribution": {
-                "beginner": 0,
-                "intermediate": 0,
-                "advanced": 0,
-            },
+            "proficiency_distribution": {level.value: 0 for level in ProficiencyLevel},
             "average_lessons_completed": 0,
             "average_practice_sessions": 0,
             "average_pronunciation_score": 0,
@@ -263,48 +344,67 @@ class SQLAlchemyUserRepository(UserRepository):
         }
 
         # Define uma semana atrás para usuários ativos
-        one_week_ago = datetime.now().timestamp() - (7 * 24 * 60 * 60)
+        one_week_ago = datetime.now() - timedelta(days=7)
+
+        def count_where(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        # Todas as métricas em uma única consulta agregada, sem carregar os usuários;
+        # as contagens por nível vêm por último, na ordem do ProficiencyLevel
+        stmt = select(
+            func.count(UserModel.id),
+            count_where(UserModel.last_interaction > one_week_ago),
+            func.avg(UserModel.lessons_completed),
+            func.avg(UserModel.practice_sessions),
+            func.avg(UserModel.pronunciation_score),
+            func.avg(UserModel.grammar_accuracy),
+            *(
+                count_where(UserModel.proficiency_level == level.value)
+                for level in ProficiencyLevel
+            ),
+        )
 
-        users = await self.list_all()
+        async with self.read_session() as session:
+            row = (await session.execute(stmt)).one()
 
-        if not users:
+        (
+            total_users,
+            active_users,
+            average_lessons,
+            average_practice,
+            average_pronunciation,
+            average_grammar,
+            *level_counts,
+        ) = row
+
+        if not total_users:
             return stats
 
-        stats["total_users"] = len(users)
-
-        # Contadores para médias
-        total_lessons = 0
-        total_practice = 0
-        total_pronunciation = 0
-        total_grammar = 0
-
-        for user in users:
-            # Contagem por nível de proficiência
-            level = user.proficiency_level.value
-            if level in stats["proficiency_distribution"]:
-                stats["proficiency_distribution"][level] += 1
-
-            # Usuários ativos na última semana
-            if (
-                user.last_interaction
-                and user.last_interaction.timestamp() > one_week_ago
-            ):
-                stats["active_users_last_week"] += 1
-
-            # Acumuladores para médias
-            total_lessons += user.progress.lessons_completed
-            total_practice += user.progress.practice_sessions
-            total_pronunciation += user.progress.pronunciation_score
-            total_grammar += user.progress.grammar_accuracy
-
-        # Calcula médias
-        stats["average_lessons_completed"] = total_lessons / len(users)
-        stats["average_practice_sessions"] = total_practice / len(users)
-        stats["average_pronunciation_score"] = total_pronunciation / len(users)
-        stats["average_grammar_accuracy"] = total_grammar / len(users)
+        stats["total_users"] = total_users
+        stats["active_users_last_week"] = int(active_users)
+        stats["proficiency_distribution"] = {
+            level.value: int(count)
+            for level, count in zip(ProficiencyLevel, level_counts)
+        }
+
+        # O PostgreSQL retorna Decimal para médias de inteiros
+        stats["average_lessons_completed"] = float(average_lessons or 0)
+        stats["average_practice_sessions"] = float(average_practice or 0)
+        stats["average_pronunciation_score"] = float(average_pronunciation or 0)
+        stats["average_grammar_accuracy"] = float(average_grammar or 0)
 
         return stats
 
+    @staticmethod
+    def _as_list(value) -> List:
+        """Lê uma coluna JSON já desserializada pelo dialeto"""
+        if isinstance(value, list):
+            return value
+        # Linhas antigas guardam a lista serializada como texto JSON
+        if isinstance(value, str):
+            return orjson.loads(value)
+        return []
+
     def _map_to_entity(self, model: UserModel) -> User:
         """Converte um modelo SQLAlchemy para uma entidade de domínio"""
         if not model:
@@ -318,11 +418,7 @@ class SQLAlchemyUserRepository(UserRepository):
             pronunciation_score=model.pronunciation_score,
             grammar_accuracy=model.grammar_accuracy,
             last_active=model.last_active,
-            completed_topics=(
-                json.loads(model.completed_topics)
-                if isinstance(model.completed_topics, str)
-                else []
-            ),
+            completed_topics=self._as_list(model.completed_topics),
         )
 
         # Cria o objeto de usuário
@@ -332,11 +428,7 @@ class SQLAlchemyUserRepository(UserRepository):
             username=model.username,
             proficiency_level=ProficiencyLevel(model.proficiency_level),
             progress=progress,
-            conversation_history=(
-                json.loads(model.conversation_history)
-                if isinstance(model.conversation_history, str)
-                else []
-            ),
+            conversation_history=self._as_list(model.conversation_history),
             created_at=model.created_at,
             last_interaction=model.last_interaction,
         )
@@ -1,7 +1,10 @@
 import asyncio
+import atexit
 import logging
+import logging.handlers
 import os
-from typing import Any, Dict, List
+import queue
+from typing import Any, Dict, List, Optional
 
 import discord
 from discord import app_commands
@@ -16,8 +19,11 @@ from src.domain.interfaces.lesson_repository import LessonRepository
 from src.domain.interfaces.speech_service import SpeechService
 from src.domain.interfaces.user_repository import UserRepository
 from src.infrastructure.external.gemini_service import GeminiService
-from src.infrastructure.external.groq_service import GroqService
+from src.infrastructure.external.groq_service import GroqService, get_groq_service
 from src.infrastructure.external.speech_service_impl import SpeechServiceImpl
+from src.infrastructure.repositories.caching_user_repository import (
+    CachingUserRepository,
+)
 from src.infrastructure.repositories.sqlalchemy_user_repository import (
     SQLAlchemyUserRepository,
 )
@@ -26,12 +32,35 @@ from src.presentation.commands.learn_command import LearnCommand
 from src.presentation.commands.pronounce_command import PronounceCommand
 from src.presentation.events.message_handler import MessageHandler
 
+
+def _setup_logging() -> logging.handlers.QueueListener:
+    """
+    Configura o logging com uma fila: o loop de eventos apenas enfileira os
+    registros e a escrita em arquivo e no console ocorre em uma thread separada.
+    """
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    handlers = [logging.FileHandler("bot.log"), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    # Garante que os registros pendentes sejam escritos ao sair
+    atexit.register(listener.stop)
+    return listener
+
+
 # Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("bot.log"), logging.StreamHandler()],
-)
+_log_listener = _setup_logging()
 logger = logging.getLogger("bot")
 
 
@@ -54,6 +83,8 @@ class EnglishTutorBot:
         self.tree = app_commands.CommandTree(self.client)
 
         # Serviços e repositórios
+        self.redis = self._setup_redis()
+        self.groq_service: Optional[GroqService] = None
         self.ai_service = self._setup_ai_service()
         self.speech_service = self._setup_speech_service()
         self.user_repository = self._setup_user_repository()
@@ -95,7 +126,8 @@ class EnglishTutorBot:
 
         # Criar os serviços individuais
         conversation_service = GeminiService(api_key=gemini_api_key)
-        feature_service = GroqService(api_key=groq_api_key)
+        feature_service = get_groq_service(api_key=groq_api_key, redis=self.redis)
+        self.groq_service = feature_service
 
         # Retornar serviço híbrido
         logger.info(
@@ -105,6 +137,17 @@ class EnglishTutorBot:
             conversation_service=conversation_service, feature_service=feature_service
         )
 
+    def _setup_redis(self) -> Optional[Any]:
+        """Cria o cliente Redis compartilhado quando REDIS_URL está definido"""
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            return None
+
+        import redis.asyncio as redis
+
+        logger.info("Usando Redis como cache compartilhado")
+        return redis.from_url(redis_url)
+
     def _setup_speech_service(self) -> SpeechService:
         """Configura e retorna o serviço de fala"""
         api_key = os.getenv(
@@ -113,9 +156,12 @@ class EnglishTutorBot:
         return SpeechServiceImpl(openai_api_key=api_key)
 
     def _setup_user_repository(self) -> UserRepository:
-        """Configura e retorna o repositório de usuários"""
+        """Configura e retorna o repositório de usuários com cache em memória"""
         database_url = os.getenv("DATABASE_URL", "sqlite:///bot_database.db")
-        return SQLAlchemyUserRepository(database_url=database_url)
+        # Cada usuário ocupa duas entradas no cache (ID e ID do Discord)
+        return CachingUserRepository(
+            SQLAlchemyUserRepository(database_url=database_url), maxsize=4096, ttl=60.0
+        )
 
     def _setup_event_handlers(self) -> None:
         """Configura os manipuladores de eventos do bot"""
@@ -124,19 +170,19 @@ class EnglishTutorBot:
         async def on_ready():
             logger.info(f"Bot conectado como {self.client.user}")
 
-            # Sincroniza os comandos com o Discord
-            await self.tree.sync()
-            logger.info("Comandos sincronizados")
-
             # Status personalizado
             activity = discord.Activity(
                 type=discord.ActivityType.listening, name="!help | Aprendendo inglês"
             )
-            await self.client.change_presence(activity=activity)
 
-            # Configuração do manipulador de mensagens
-            await self.message_handler.setup(self.client)
-            logger.info("Manipulador de mensagens configurado")
+            # Sincronização dos comandos, status e manipulador de mensagens são
+            # independentes, então rodam em paralelo
+            await asyncio.gather(
+                self.tree.sync(),
+                self.client.change_presence(activity=activity),
+                self.message_handler.setup(self.client),
+            )
+            logger.info("Comandos sincronizados e manipulador de mensagens configurado")
 
     def _register_commands(self) -> None:
         """Registra os comandos do bot"""
@@ -156,13 +202,48 @@ class EnglishTutorBot:
         for command in self.commands:
             command.register(self.tree)
 
+    async def setup(self) -> None:
+        """Prepara os recursos assíncronos antes de conectar ao Discord"""
+        await self.user_repository.initialize()
+
+    async def _start(self) -> None:
+        """Conecta o bot e libera os recursos compartilhados ao encerrar"""
+        try:
+            await self.setup()
+            async with self.client:
+                await self.client.start(self.token)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Fecha as conexões HTTP, o pool do banco e o cliente Redis compartilhados"""
+        if self.groq_service is not None:
+            await self.groq_service.aclose()
+        await self.speech_service.aclose()
+        await self.user_repository.aclose()
+        if self.redis is not None:
+            await self.redis.aclose()
+
     def run(self) -> None:
         """Inicia o bot"""
         logger.info("Iniciando o bot com serviços híbridos: Gemini + Groq")
-        self.client.run(self.token)
+        try:
+            asyncio.run(self._start())
+        except KeyboardInterrupt:
+            # Encerramento pelo terminal, como no client.run do discord.py
+            logger.info("Bot encerrado")
 
 
 if __name__ == "__main__":
+    # Usa o uvloop como loop de eventos quando disponível (não suportado no Windows)
+    try:
+        import uvloop
+
+        uvloop.install()
+        logger.info("Usando uvloop como loop de eventos")
+    except ImportError:
+        pass
+
     try:
         bot = EnglishTutorBot()
         bot.run()
@@ -1,4 +1,5 @@
 import asyncio
+import logging
 from typing import Any, Dict, Optional
 
 import discord
@@ -8,6 +9,8 @@ from src.application.use_cases.conversation_handler import ConversationHandlerUs
 from src.application.use_cases.user_management import UserManagementUseCase
 from src.presentation.commands.base_command import SlashCommand
 
+logger = logging.getLogger(__name__)
+
 
 class LearnCommand(SlashCommand):
     """Comando para iniciar uma sessão de aprendizado sobre um tópico específico"""
@@ -38,15 +41,10 @@ class LearnCommand(SlashCommand):
         # Obtém o tópico da interação
         topic = kwargs.get("topic", "inglês geral")
 
-        # Obtém o usuário ou registra um novo
-        user = await self.user_management.get_user_by_discord_id(
-            str(interaction.user.id)
+        # Obtém o usuário ou registra um novo em uma única chamada
+        user = await self.user_management.get_or_create_user(
+            discord_id=str(interaction.user.id), username=interaction.user.display_name
         )
-        if not user:
-            user = await self.user_management.register_user(
-                discord_id=str(interaction.user.id),
-                username=interaction.user.display_name,
-            )
 
         # Responde a interação inicialmente
         await interaction.response.send_message(
@@ -65,12 +63,14 @@ class LearnCommand(SlashCommand):
                 f"**Tópico:** {topic}\n\n{welcome_message}\n\n*Para continuar a conversa, basta responder a esta mensagem ou mencionar @VerbaMentor*"
             )
 
-            print(
-                f"Sessão de aprendizado iniciada com sucesso para o usuário {user.id} sobre {topic}"
+            logger.info(
+                "Sessão de aprendizado iniciada com sucesso para o usuário %s sobre %s",
+                user.id,
+                topic,
             )
 
-        except Exception as e:
-            print(f"ERRO ao executar comando learn: {e}")
+        except Exception:
+            logger.exception("Erro ao executar comando learn")
             await interaction.followup.send(
                 f"❌ Desculpe, ocorreu um erro ao iniciar a sessão sobre {topic}. Por favor, tente novamente."
             )
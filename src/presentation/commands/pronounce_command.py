@@ -1,3 +1,6 @@
+import asyncio
+import contextlib
+import logging
 import os
 import tempfile
 from typing import Any, Dict, List, Optional
@@ -9,10 +12,40 @@ from src.application.use_cases.user_management import UserManagementUseCase
 from src.domain.interfaces.speech_service import SpeechService
 from src.presentation.commands.base_command import SlashCommand
 
+logger = logging.getLogger(__name__)
+
+# Mensagens fixas do comando, montadas uma única vez na importação do módulo
+_PROMPT_HEAD = "📝 Para avaliar sua pronúncia, envie um arquivo de áudio como resposta a esta mensagem.\n"
+_PROMPT_TAIL = (
+    "Você também pode anexar o arquivo de áudio diretamente ao usar este comando."
+)
+_PROMPT_MSG = _PROMPT_HEAD + _PROMPT_TAIL
+_PROMPT_WITH_TEXT_TMPL = _PROMPT_HEAD + "Texto esperado: **%s**\n" + _PROMPT_TAIL
+_DOWNLOADING_MSG = "🔊 Baixando seu áudio, por favor aguarde..."
+_TRANSCRIBING_MSG = "🧠 Transcrevendo seu áudio..."
+_AUDIO_ERROR_TMPL = "❌ Não foi possível processar seu áudio: %s"
+_DOWNLOAD_ERROR_MSG = _AUDIO_ERROR_TMPL % "Não foi possível baixar o arquivo de áudio"
+# O detalhe do erro fica só no log; o usuário vê uma mensagem genérica
+_TRANSCRIPTION_ERROR_MSG = (
+    _AUDIO_ERROR_TMPL % "Não foi possível transcrever o áudio. Tente novamente."
+)
+_DONE_MSG = "✅ Áudio processado! O resultado foi publicado no canal."
+
 
 class PronounceCommand(SlashCommand):
     """Comando para avaliar a pronúncia de um usuário"""
 
+    # Extensões de áudio aceitas, sem o ponto
+    _VALID_AUDIO_EXTS = frozenset({"mp3", "wav", "ogg", "m4a"})
+
+    # Faixas de pontuação em ordem decrescente, com as cores criadas uma única vez
+    _SCORE_COLORS = (
+        (90, discord.Color.green()),
+        (70, discord.Color.gold()),
+        (50, discord.Color.orange()),
+    )
+    _LOW_SCORE_COLOR = discord.Color.red()
+
     def __init__(
         self, speech_service: SpeechService, user_management: UserManagementUseCase
     ):
@@ -36,24 +69,17 @@ class PronounceCommand(SlashCommand):
     async def execute(self, interaction: discord.Interaction, **kwargs) -> None:
         """Executa o comando de avaliação de pronúncia"""
 
-        # Verifica se o usuário está registrado
-        user = await self.user_management.get_user_by_discord_id(
-            str(interaction.user.id)
+        # Obtém o usuário ou registra um novo em uma única chamada
+        user = await self.user_management.get_or_create_user(
+            discord_id=str(interaction.user.id), username=interaction.user.display_name
         )
-        if not user:
-            user = await self.user_management.register_user(
-                discord_id=str(interaction.user.id),
-                username=interaction.user.display_name,
-            )
 
         # Obtém o texto esperado, se fornecido
         expected_text = kwargs.get("text", "")
 
         # Responde inicialmente
         await interaction.response.send_message(
-            "📝 Para avaliar sua pronúncia, envie um arquivo de áudio como resposta a esta mensagem.\n"
-            + (f"Texto esperado: **{expected_text}**\n" if expected_text else "")
-            + "Você também pode anexar o arquivo de áudio diretamente ao usar este comando.",
+            _PROMPT_WITH_TEXT_TMPL % expected_text if expected_text else _PROMPT_MSG,
             ephemeral=True,
         )
 
@@ -74,38 +100,49 @@ class PronounceCommand(SlashCommand):
     ) -> None:
         """Processa um anexo de áudio para avaliação de pronúncia"""
 
-        # Informa que está processando
-        await interaction.followup.send(
-            "🔊 Processando seu áudio, por favor aguarde...", ephemeral=True
+        # Uma única mensagem privada acompanha as etapas e os erros; só o resultado
+        # é publicado no canal
+        status_message = await interaction.followup.send(
+            _DOWNLOADING_MSG, ephemeral=True, wait=True
         )
 
-        # Processa a gravação de voz
-        result = await self.speech_service.process_user_voice_recording(
-            discord_attachment_url=attachment.url, user_id=user_id
+        # Baixa o áudio uma única vez; a transcrição e a análise usam o mesmo arquivo
+        audio_file_path = await self.speech_service.download_attachment(
+            attachment.url, user_id
         )
+        if not audio_file_path:
+            await self._edit_status(status_message, _DOWNLOAD_ERROR_MSG)
+            return
 
-        if not result.get("success", False):
-            await interaction.followup.send(
-                f"❌ Não foi possível processar seu áudio: {result.get('error', 'Erro desconhecido')}",
-                ephemeral=True,
+        # O aviso de etapa não precisa atrasar o início da transcrição
+        try:
+            _, result = await asyncio.gather(
+                self._edit_status(status_message, _TRANSCRIBING_MSG),
+                self.speech_service.transcribe_audio(audio_file_path),
             )
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(audio_file_path)
+
+        if not result.get("success", False):
+            await self._edit_status(status_message, _TRANSCRIPTION_ERROR_MSG)
             return
 
         transcribed_text = result.get("text", "")
 
         # Se não tiver texto esperado, apenas mostra a transcrição
         if not expected_text:
-            await interaction.followup.send(
-                f"📝 Transcrição: **{transcribed_text}**", ephemeral=False
+            await asyncio.gather(
+                interaction.followup.send(
+                    f"📝 Transcrição: **{transcribed_text}**", ephemeral=False
+                ),
+                self._edit_status(status_message, _DONE_MSG),
             )
             return
 
-        # Analisa a pronúncia comparando com o texto esperado
-        pronunciation_result = await self.speech_service.analyze_pronunciation(
-            audio_file_path=result.get(
-                "file_path", ""
-            ),  # Pode não estar disponível na implementação atual
-            expected_text=expected_text,
+        # Analisa a pronúncia a partir da transcrição já obtida, sem transcrever de novo
+        pronunciation_result = self.speech_service.score_pronunciation(
+            transcribed_text=transcribed_text, expected_text=expected_text
         )
 
         # Formata o resultado para o usuário
@@ -114,13 +151,6 @@ class PronounceCommand(SlashCommand):
             "feedback", "Não foi possível gerar feedback."
         )
 
-        # Atualiza o progresso do usuário
-        await self.user_management.update_user_progress(
-            user_id=user_id,
-            progress_data={"pronunciation_score": score / 100},  # Normaliza para 0-1
-        )
-
-        # Envia o resultado
         embed = discord.Embed(
             title="Avaliação de Pronúncia", color=self._get_score_color(score)
         )
@@ -129,21 +159,39 @@ class PronounceCommand(SlashCommand):
         embed.add_field(name="Pontuação", value=f"{score:.1f}%", inline=True)
         embed.add_field(name="Feedback", value=feedback, inline=False)
 
-        await interaction.followup.send(embed=embed, ephemeral=False)
+        # Atualiza o progresso do usuário e envia o resultado ao mesmo tempo
+        await asyncio.gather(
+            self.user_management.update_user_progress(
+                user_id=user_id,
+                progress_data={
+                    "pronunciation_score": score / 100
+                },  # Normaliza para 0-1
+            ),
+            interaction.followup.send(embed=embed, ephemeral=False),
+            self._edit_status(status_message, _DONE_MSG),
+        )
+
+    @staticmethod
+    async def _edit_status(
+        status_message: discord.WebhookMessage, content: str
+    ) -> None:
+        """Atualiza a mensagem de status; uma falha nessa edição não interrompe o fluxo"""
+        try:
+            await status_message.edit(content=content)
+        except discord.HTTPException:
+            logger.warning(
+                "Não foi possível atualizar a mensagem de status", exc_info=True
+            )
 
     def _is_valid_audio_file(self, filename: str) -> bool:
         """Verifica se o arquivo é um formato de áudio válido"""
-        valid_extensions = [".mp3", ".wav", ".ogg", ".m4a"]
-        ext = os.path.splitext(filename.lower())[1]
-        return ext in valid_extensions
+        _, dot, ext = filename.rpartition(".")
+        return bool(dot) and ext.lower() in self._VALID_AUDIO_EXTS
 
-    def _get_score_color(self, score: float) -> discord.Color:
+    @classmethod
+    def _get_score_color(cls, score: float) -> discord.Color:
         """Retorna uma cor baseada na pontuação"""
-        if score >= 90:
-            return discord.Color.green()
-        elif score >= 70:
-            return discord.Color.gold()
-        elif score >= 50:
-            return discord.Color.orange()
-        else:
-            return discord.Color.red()
+        for threshold, color in cls._SCORE_COLORS:
+            if score >= threshold:
+                return color
+        return cls._LOW_SCORE_COLOR
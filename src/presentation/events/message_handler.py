@@ -1,14 +1,81 @@
+import asyncio
+import io
+import logging
+import re
+import time
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
 import discord
 
 from src.application.use_cases.conversation_handler import ConversationHandlerUseCase
 from src.application.use_cases.user_management import UserManagementUseCase
+from src.domain.entities.user import User
+
+logger = logging.getLogger(__name__)
+
+# Resposta quando o contexto de uma conversa não está mais em memória
+_CONV_LOST_MSG = (
+    "Desculpe, não consegui recuperar o contexto desta conversa. "
+    "Por favor, inicie uma nova com `/learn [tópico]`."
+)
+
+# Convite para continuar a conversa, anexado ao final das respostas do bot
+_REPLY_SUFFIX = (
+    "\n\n*Para continuar a conversa, responda a esta mensagem ou mencione @VerbaMentor*"
+)
+
+
+def _build_help_embed() -> discord.Embed:
+    """Monta o embed de ajuda com os comandos disponíveis"""
+    embed = discord.Embed(
+        title="Comandos do Bot",
+        description="Aqui estão os comandos disponíveis para ajudar no seu aprendizado de inglês:",
+        color=discord.Color.blue(),
+    )
+
+    # Comandos slash
+    embed.add_field(
+        name="Comandos Slash (Recomendados)",
+        value=(
+            "**/learn [tópico]** - Inicia uma sessão de aprendizado sobre um tópico\n"
+            "**/practice** - Inicia uma sessão de prática conversacional\n"
+            "**/progress** - Exibe seu progresso de aprendizado\n"
+            "**/pronounce [texto]** - Avalia sua pronúncia de uma frase"
+        ),
+        inline=False,
+    )
+
+    # Comandos de texto
+    embed.add_field(
+        name="Comandos de Texto",
+        value=(
+            "**!help** - Exibe esta mensagem de ajuda\n"
+            "**!learn [tópico]** - Inicia uma sessão de aprendizado\n"
+            "**!progress** - Exibe seu progresso de aprendizado"
+        ),
+        inline=False,
+    )
+
+    embed.set_footer(
+        text="Responda a qualquer mensagem do bot para continuar a conversa!"
+    )
+    return embed
+
+
+# O conteúdo da ajuda é fixo, então o embed é montado uma única vez
+_HELP_EMBED = _build_help_embed()
+
+# Cor do embed de progresso, já no formato inteiro usado pelo from_dict
+_PROGRESS_COLOR = discord.Color.blue().value
 
 
 class MessageHandler:
     """Classe responsável por tratar mensagens recebidas pelo bot"""
 
+    # IDs do Discord com acesso aos comandos administrativos
+    _ADMIN_IDS = frozenset({"301044875383447562"})  # Substituir pelo ID do admin
+
     def __init__(
         self,
         conversation_handler: ConversationHandlerUseCase,
@@ -19,16 +86,39 @@ class MessageHandler:
 
         # Armazenamento em memória de conversas ativas (simulando um repositório)
         # Em uma implementação real, isso estaria em um banco de dados
-        self.active_conversations: Dict[int, Dict[str, Any]] = {}
+        # LRU limitado: as conversas menos usadas são descartadas ao atingir o limite
+        self.active_conversations: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._max_conversations = 10_000
 
         # Prefixo para comandos de texto (alternativa aos slash commands)
         self.text_prefix = "!"
 
-        print("MessageHandler inicializado")
+        # Comandos de texto por nome; todos recebem (mensagem, argumentos, ID do usuário)
+        self._text_commands = {
+            "help": lambda message, args, user_id: self._send_help_message(
+                message.channel
+            ),
+            "learn": self._handle_learn_command,
+            "progress": lambda message, args, user_id: self._handle_progress_command(
+                message, user_id
+            ),
+            "debug": lambda message, args, user_id: self._handle_admin_command(
+                message, self._handle_debug_command
+            ),
+        }
+
+        # Intervalo mínimo, em segundos, entre edições da resposta em streaming
+        # para respeitar o limite de edições do Discord
+        self.stream_edit_interval = 1.0
+
+        # Padrão das menções ao bot, compilado na primeira mensagem direcionada a ele
+        self._mention_re: Optional[re.Pattern] = None
+
+        logger.info("MessageHandler inicializado")
 
     async def setup(self, client: discord.Client) -> None:
         """Configura os listeners de eventos"""
-        print("Configurando event listeners no MessageHandler")
+        logger.info("Configurando event listeners no MessageHandler")
 
         @client.event
         async def on_message(message: discord.Message) -> None:
@@ -36,80 +126,127 @@ class MessageHandler:
             if message.author.bot:
                 return
 
-            print(
-                f"Mensagem recebida: {message.content[:30]}... de {message.author.display_name}"
+            logger.debug(
+                "Mensagem recebida: %.30s... de %s",
+                message.content,
+                message.author.display_name,
             )
 
             # Processa comandos baseados em texto (para compatibilidade)
             if message.content.startswith(self.text_prefix):
-                print(f"Processando comando de texto: {message.content}")
+                logger.debug("Processando comando de texto: %s", message.content)
                 await self._handle_text_command(message)
                 return
 
             # Verifica se é uma resposta para o bot (resposta direta ou menção)
             is_for_bot = False
+            user = None
 
             # Verifica se é uma resposta direta a uma mensagem do bot
             if message.reference and message.reference.message_id:
-                try:
-                    # Tenta buscar a mensagem referenciada
-                    ref_msg = await message.channel.fetch_message(
-                        message.reference.message_id
+                # O gateway normalmente já entrega a mensagem referenciada,
+                # evitando uma chamada REST por resposta
+                ref_msg = message.reference.cached_message
+                if ref_msg is None and isinstance(
+                    message.reference.resolved, discord.Message
+                ):
+                    ref_msg = message.reference.resolved
+
+                if ref_msg is None:
+                    # Busca a mensagem referenciada e o usuário ao mesmo tempo,
+                    # já que uma busca não depende da outra
+                    ref_msg, user = await asyncio.gather(
+                        message.channel.fetch_message(message.reference.message_id),
+                        self.user_management.get_user_by_discord_id(
+                            str(message.author.id)
+                        ),
+                        return_exceptions=True,
                     )
-                    if ref_msg.author.id == client.user.id:
-                        is_for_bot = True
-                        print(f"É uma resposta direta ao bot")
-                except Exception as e:
-                    print(f"Erro ao buscar mensagem referenciada: {e}")
+                    if isinstance(user, BaseException):
+                        logger.warning("Erro ao buscar usuário: %s", user)
+                        user = None
+
+                if isinstance(ref_msg, BaseException):
+                    logger.warning("Erro ao buscar mensagem referenciada: %s", ref_msg)
+                elif ref_msg.author.id == client.user.id:
+                    is_for_bot = True
+                    logger.debug("É uma resposta direta ao bot")
 
             # Verifica se o bot foi mencionado
             if client.user.mentioned_in(message):
                 is_for_bot = True
-                print(f"O bot foi mencionado")
+                logger.debug("O bot foi mencionado")
 
             # Processa a mensagem se for para o bot
             if is_for_bot:
-                await self._handle_bot_message(message, client)
+                await self._handle_bot_message(message, client, user)
                 return
 
-            print("Mensagem ignorada (não é comando nem direcionada ao bot)")
+            logger.debug("Mensagem ignorada (não é comando nem direcionada ao bot)")
 
-        print("Event listeners configurados")
+        logger.info("Event listeners configurados")
 
-    async def _handle_bot_message(self, message: discord.Message, client) -> None:
-        """Trata mensagens direcionadas ao bot"""
+    async def _handle_bot_message(
+        self, message: discord.Message, client, user: Optional[User] = None
+    ) -> None:
+        """Trata mensagens direcionadas ao bot, reaproveitando o usuário já buscado"""
         try:
-            # Obtém ou registra o usuário
-            user = await self.user_management.get_user_by_discord_id(
-                str(message.author.id)
-            )
-            if not user:
-                user = await self.user_management.register_user(
-                    discord_id=str(message.author.id),
-                    username=message.author.display_name,
-                )
-
-            # Remove menções ao bot da mensagem
-            content = message.content
-            for mention in message.mentions:
-                if mention.id == client.user.id:
-                    content = content.replace(f"<@{mention.id}>", "").strip()
-                    content = content.replace(f"<@!{mention.id}>", "").strip()
-
-            # Processa a mensagem
-            print(f"Processando mensagem para usuário {user.id}: {content[:30]}...")
-            response = await self.conversation_handler.process_message(
-                user_id=user.id, message_content=content
-            )
+            # Registro e resposta são gravados juntos ao final do bloco
+            async with self.user_management.unit_of_work():
+                # Obtém o usuário ou registra um novo em uma única chamada
+                if user is None:
+                    user = await self.user_management.get_or_create_user(
+                        discord_id=str(message.author.id),
+                        username=message.author.display_name,
+                    )
 
-            # Envia a resposta
-            await message.channel.send(
-                f"{response}\n\n*Para continuar a conversa, responda a esta mensagem ou mencione @VerbaMentor*",
-                reference=message,
-            )
+                # Remove menções ao bot da mensagem
+                content = message.content
+                if message.mentions:
+                    if self._mention_re is None:
+                        self._mention_re = re.compile(rf"<@!?{client.user.id}>")
+                    content = self._mention_re.sub("", content).strip()
 
-        except Exception as e:
-            print(f"ERRO ao processar mensagem: {e}")
+                # Processa a mensagem, exibindo a resposta conforme ela é gerada
+                logger.debug(
+                    "Processando mensagem para usuário %s: %.30s...", user.id, content
+                )
+                response = ""
+                sent_message = None
+                last_edit = 0.0
+                partial_updates = True
+                async for chunk in self.conversation_handler.stream_message(
+                    user_id=user.id, message_content=content
+                ):
+                    response += chunk
+                    if not partial_updates or not response.strip():
+                        continue
+
+                    # Uma falha do Discord não pode descartar o turno da conversa e o
+                    # progresso gravados ao final do bloco; a geração segue até o fim
+                    now = time.monotonic()
+                    try:
+                        if sent_message is None:
+                            sent_message = await message.channel.send(
+                                response, reference=message
+                            )
+                            last_edit = now
+                        elif now - last_edit >= self.stream_edit_interval:
+                            await sent_message.edit(content=response)
+                            last_edit = now
+                    except discord.HTTPException:
+                        logger.exception("Erro ao exibir resposta parcial")
+                        partial_updates = False
+
+            # Envia a resposta final, já com a conversa gravada
+            final_content = response + _REPLY_SUFFIX
+            if sent_message is None:
+                await message.channel.send(final_content, reference=message)
+            else:
+                await sent_message.edit(content=final_content)
+
+        except Exception:
+            logger.exception("Erro ao processar mensagem")
             await message.channel.send(
                 "Ocorreu um erro ao processar sua mensagem. Por favor, tente novamente.",
                 reference=message,
@@ -124,25 +261,22 @@ class MessageHandler:
         command = parts[0].lower() if parts else ""
         args = parts[1] if len(parts) > 1 else ""
 
-        # Obtém ou registra o usuário
-        user = await self.user_management.get_user_by_discord_id(str(message.author.id))
-        if not user:
-            user = await self.user_management.register_user(
-                discord_id=str(message.author.id), username=message.author.display_name
-            )
+        # Comandos desconhecidos são ignorados sem consultar o usuário
+        handler = self._text_commands.get(command)
+        if handler is None:
+            return
+
+        # Obtém o usuário ou registra um novo em uma única chamada
+        user = await self.user_management.get_or_create_user(
+            discord_id=str(message.author.id), username=message.author.display_name
+        )
+
+        await handler(message, args, user.id)
 
-        # Lógica para diferentes comandos
-        if command == "help":
-            await self._send_help_message(message.channel)
-        elif command == "learn":
-            await self._handle_learn_command(message, args, user.id)
-        elif command == "progress":
-            await self._handle_progress_command(message, user.id)
-        elif (
-            command == "debug" and str(message.author.id) == "301044875383447562"
-        ):  # Substituir pelo ID do admin
-            await self._handle_debug_command(message)
-        # Adicione mais comandos conforme necessário
+    async def _handle_admin_command(self, message: discord.Message, handler) -> None:
+        """Executa o comando apenas se o autor da mensagem for administrador"""
+        if str(message.author.id) in self._ADMIN_IDS:
+            await handler(message)
 
     async def _handle_conversation_message(self, message: discord.Message) -> None:
         """Trata mensagens que são parte de uma conversa ativa"""
@@ -150,17 +284,18 @@ class MessageHandler:
         conversation_data = self.active_conversations.get(message.reference.message_id)
 
         if not conversation_data:
-            print(
-                f"ERRO: Conversa não encontrada para mensagem {message.reference.message_id}"
+            logger.warning(
+                "Conversa não encontrada para mensagem %s",
+                message.reference.message_id,
             )
             await message.channel.send(
-                "Desculpe, não consegui recuperar o contexto desta conversa. Por favor, inicie uma nova com `/learn [tópico]`.",
+                _CONV_LOST_MSG,
                 reference=message,
             )
             return
 
         user_id = conversation_data.get("user_id")
-        print(f"Processando mensagem para usuário {user_id}")
+        logger.debug("Processando mensagem para usuário %s", user_id)
 
         # Processa a mensagem com o manipulador de conversação
         try:
@@ -170,46 +305,59 @@ class MessageHandler:
 
             # Responde ao usuário
             sent_message = await message.channel.send(
-                content=f"{response}\n\n*Responda a esta mensagem para continuar a conversa*",
+                content=response + _REPLY_SUFFIX,
                 reference=message,
             )
 
-            # Armazena a nova mensagem como parte da conversa ativa
+            # A nova resposta passa a ser a única entrada da conversa ativa;
+            # a mensagem respondida deixa de ser a ponta da conversa
+            self.active_conversations.pop(message.reference.message_id, None)
             conversation_data["message_id"] = sent_message.id
-            self.active_conversations[sent_message.id] = conversation_data
+            self._put_conversation(sent_message.id, conversation_data)
 
-            # Mantém o registro da mensagem original também
-            self.active_conversations[message.reference.message_id] = conversation_data
-
-            print(f"Resposta enviada, ID: {sent_message.id}")
-            print(
-                f"Conversas ativas atualizadas: {list(self.active_conversations.keys())}"
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Resposta enviada, ID: %s", sent_message.id)
+                logger.debug(
+                    "Conversas ativas atualizadas: %s",
+                    list(self.active_conversations.keys()),
+                )
 
-        except Exception as e:
-            print(f"ERRO ao processar mensagem: {e}")
+        except Exception:
+            logger.exception("Erro ao processar mensagem")
             await message.channel.send(
                 "Ocorreu um erro ao processar sua mensagem. Por favor, tente novamente ou inicie uma nova conversa.",
                 reference=message,
             )
 
+    def _put_conversation(self, message_id: int, data: Dict[str, Any]) -> None:
+        """Registra a conversa ativa, descartando as menos usadas acima do limite"""
+        self.active_conversations[message_id] = data
+        self.active_conversations.move_to_end(message_id)
+        while len(self.active_conversations) > self._max_conversations:
+            self.active_conversations.popitem(last=False)
+
     async def _is_part_of_conversation(self, message: discord.Message) -> bool:
         """Verifica se a mensagem é parte de uma conversa ativa"""
         # Verifica se é uma resposta a outra mensagem
         if not message.reference or not message.reference.message_id:
-            print(f"Mensagem {message.id} não é uma resposta a nenhuma mensagem")
+            logger.debug(
+                "Mensagem %s não é uma resposta a nenhuma mensagem", message.id
+            )
             return False
 
         # Obtém o ID da mensagem referenciada
         ref_id = message.reference.message_id
-        print(f"Mensagem {message.id} é uma resposta à mensagem {ref_id}")
-        print(f"Conversas ativas: {list(self.active_conversations.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mensagem %s é uma resposta à mensagem %s", message.id, ref_id)
+            logger.debug("Conversas ativas: %s", list(self.active_conversations.keys()))
 
         # Verifica se a mensagem referenciada é parte de uma conversa ativa
         is_part = ref_id in self.active_conversations
+        if is_part:
+            self.active_conversations.move_to_end(ref_id)
 
         if not is_part:
-            print(f"A mensagem {ref_id} não está nas conversas ativas")
+            logger.debug("A mensagem %s não está nas conversas ativas", ref_id)
             # Tenta responder para informar o usuário
             try:
                 await message.channel.send(
@@ -217,8 +365,8 @@ class MessageHandler:
                     "Por favor, inicie uma nova conversa com `/learn [tópico]` ou `!learn [tópico]`.",
                     reference=message,
                 )
-            except Exception as e:
-                print(f"Erro ao enviar mensagem de resposta: {e}")
+            except Exception:
+                logger.exception("Erro ao enviar mensagem de resposta")
 
         return is_part
 
@@ -242,15 +390,17 @@ class MessageHandler:
 
             # Atualiza a mensagem com o resultado
             await response_message.edit(
-                content=f"**Tópico:** {topic}\n\n{welcome_message}\n\n*Para continuar a conversa, responda a esta mensagem ou mencione @VerbaMentor*"
+                content=f"**Tópico:** {topic}\n\n{welcome_message}{_REPLY_SUFFIX}"
             )
 
-            print(
-                f"Sessão de aprendizado iniciada com sucesso para o usuário {user_id} sobre {topic}"
+            logger.info(
+                "Sessão de aprendizado iniciada com sucesso para o usuário %s sobre %s",
+                user_id,
+                topic,
             )
 
-        except Exception as e:
-            print(f"ERRO ao iniciar sessão de aprendizado: {e}")
+        except Exception:
+            logger.exception("Erro ao iniciar sessão de aprendizado")
             await response_message.edit(
                 content=f"❌ Desculpe, ocorreu um erro ao iniciar a sessão sobre {topic}. Por favor, tente novamente."
             )
@@ -268,105 +418,96 @@ class MessageHandler:
             )
             return
 
-        # Cria um embed para exibir o progresso
-        embed = discord.Embed(
-            title="Seu Progresso de Aprendizado", color=discord.Color.blue()
-        )
-
-        embed.add_field(
-            name="Nível", value=progress["proficiency_level"].upper(), inline=True
-        )
-        embed.add_field(
-            name="Vocabulário",
-            value=f"{progress['vocabulary_mastered']} palavras",
-            inline=True,
-        )
-        embed.add_field(
-            name="Lições",
-            value=f"{progress['lessons_completed']} concluídas",
-            inline=True,
-        )
-
-        embed.add_field(
-            name="Pronúncia", value=f"{progress['pronunciation_score']}%", inline=True
-        )
-        embed.add_field(
-            name="Gramática", value=f"{progress['grammar_accuracy']}%", inline=True
-        )
-        embed.add_field(
-            name="Sessões",
-            value=f"{progress['practice_sessions']} práticas",
-            inline=True,
-        )
+        # Monta todos os campos de uma vez, sem uma chamada a add_field por campo
+        fields = [
+            {
+                "name": "Nível",
+                "value": progress["proficiency_level"].upper(),
+                "inline": True,
+            },
+            {
+                "name": "Vocabulário",
+                "value": f"{progress['vocabulary_mastered']} palavras",
+                "inline": True,
+            },
+            {
+                "name": "Lições",
+                "value": f"{progress['lessons_completed']} concluídas",
+                "inline": True,
+            },
+            {
+                "name": "Pronúncia",
+                "value": f"{progress['pronunciation_score']}%",
+                "inline": True,
+            },
+            {
+                "name": "Gramática",
+                "value": f"{progress['grammar_accuracy']}%",
+                "inline": True,
+            },
+            {
+                "name": "Sessões",
+                "value": f"{progress['practice_sessions']} práticas",
+                "inline": True,
+            },
+        ]
 
         # Adiciona tópicos concluídos, se houver
-        if progress["completed_topics"]:
-            topics = ", ".join(progress["completed_topics"][:5])
-            if len(progress["completed_topics"]) > 5:
-                topics += f" e mais {len(progress['completed_topics']) - 5}..."
+        completed_topics = progress["completed_topics"]
+        if completed_topics:
+            topics = ", ".join(completed_topics[:5])
+            if len(completed_topics) > 5:
+                topics += f" e mais {len(completed_topics) - 5}..."
+
+            fields.append(
+                {"name": "Tópicos Concluídos", "value": topics, "inline": False}
+            )
 
-            embed.add_field(name="Tópicos Concluídos", value=topics, inline=False)
+        embed_data = {
+            "title": "Seu Progresso de Aprendizado",
+            "color": _PROGRESS_COLOR,
+            "fields": fields,
+        }
 
         # Adiciona a última atividade
         if progress.get("last_active"):
-            embed.set_footer(text=f"Última atividade: {progress['last_active']}")
+            embed_data["footer"] = {
+                "text": f"Última atividade: {progress['last_active']}"
+            }
+
+        embed = discord.Embed.from_dict(embed_data)
 
         await message.channel.send(embed=embed)
 
     async def _send_help_message(self, channel: discord.TextChannel) -> None:
         """Envia uma mensagem de ajuda com os comandos disponíveis"""
-        embed = discord.Embed(
-            title="Comandos do Bot",
-            description="Aqui estão os comandos disponíveis para ajudar no seu aprendizado de inglês:",
-            color=discord.Color.blue(),
-        )
-
-        # Comandos slash
-        embed.add_field(
-            name="Comandos Slash (Recomendados)",
-            value=(
-                "**/learn [tópico]** - Inicia uma sessão de aprendizado sobre um tópico\n"
-                "**/practice** - Inicia uma sessão de prática conversacional\n"
-                "**/progress** - Exibe seu progresso de aprendizado\n"
-                "**/pronounce [texto]** - Avalia sua pronúncia de uma frase"
-            ),
-            inline=False,
-        )
-
-        # Comandos de texto
-        embed.add_field(
-            name="Comandos de Texto",
-            value=(
-                "**!help** - Exibe esta mensagem de ajuda\n"
-                "**!learn [tópico]** - Inicia uma sessão de aprendizado\n"
-                "**!progress** - Exibe seu progresso de aprendizado"
-            ),
-            inline=False,
-        )
-
-        embed.set_footer(
-            text="Responda a qualquer mensagem do bot para continuar a conversa!"
-        )
-
-        await channel.send(embed=embed)
+        await channel.send(embed=_HELP_EMBED)
 
     async def _handle_debug_command(self, message: discord.Message) -> None:
         """Comando de debug para ver conversas ativas (somente admin)"""
         active_count = len(self.active_conversations)
-        debug_text = f"🔍 Conversas ativas: {active_count}\n\n"
+        header = f"🔍 Conversas ativas: {active_count}\n\n"
 
         if active_count == 0:
-            debug_text += "Nenhuma conversa ativa no momento."
-        else:
-            for msg_id, data in self.active_conversations.items():
-                user_id = data.get("user_id", "desconhecido")
-                topic = data.get("topic", "sem tópico")
-                debug_text += f"ID: {msg_id} | Usuário: {user_id} | Tópico: {topic}\n"
-
-        # Dividir em partes se for muito longo
-        if len(debug_text) > 1900:
-            parts = [debug_text[i : i + 1900] for i in range(0, len(debug_text), 1900)]
-            for part in parts:
-                await message.channel.send(f"```{part}```")
-        else:
-            await message.channel.send(f"```{debug_text}```")
+            await message.channel.send(
+                f"```{header}Nenhuma conversa ativa no momento.```"
+            )
+            return
+
+        # Cópia das entradas, pois o dicionário pode mudar durante os envios
+        entries = list(self.active_conversations.items())
+
+        # Envia em partes de até 1900 caracteres conforme as linhas são montadas,
+        # sem construir o texto completo
+        buffer = io.StringIO()
+        buffer.write(header)
+        for msg_id, data in entries:
+            user_id = data.get("user_id", "desconhecido")
+            topic = data.get("topic", "sem tópico")
+            line = f"ID: {msg_id} | Usuário: {user_id} | Tópico: {topic}\n"
+            if buffer.tell() and buffer.tell() + len(line) > 1900:
+                await message.channel.send(f"```{buffer.getvalue()}```")
+                buffer = io.StringIO()
+            buffer.write(line)
+
+        await message.channel.send(f"```{buffer.getvalue()}```")